@@ -0,0 +1,192 @@
+# Benchmarks of the CDU frame decoders of the SimConnect bridges.
+#
+# 1. PMDG 737/777 create_mobi_json against the per-cell loop it replaced:
+#   per cell: chr()/islower()/upper(), an if/elif chain for special glyphs and a colour dict per cell,
+#             then json.dumps() of the whole message
+#   tables:   column-major -> row-major index map and 256-entry symbol / 65536-entry colour x flags
+#             tables holding ready-made JSON fragments (create_mobi_json in the bridges)
+# Both must produce byte-identical JSON; every frame is checked before timing.
+#
+# 2. Pure-Python create_mobi_json against the optional NumPy backend (create_mobi_json_numpy) for
+#    every aircraft, again checked for identical output first. Skipped when NumPy is not installed.
+#
+# Frames are either recorded ones (--frames <file>: CDU buffers of CDU_DATA_SIZE bytes back to back,
+# as copied out by client_data_bytes() in handle_cdu_data) or a synthetic recording: pages where a
+# few cells change per frame, as fed to the bridges by fake_simconnect.py, plus random frames that
+# cover every symbol, colour and flag byte.
+#
+# Usage: python cdu_decoder_benchmark.py [--frames file] [--count 2000] [--changes 4]
+#        (--frames applies to the PMDG comparison)
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import random
+import struct
+import sys
+from time import perf_counter
+from typing import Callable, List
+
+def _load_fake_simconnect():
+    # loaded from its path next to this file, so the benchmark runs from any directory
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_simconnect.py")
+    spec = importlib.util.spec_from_file_location("fake_simconnect", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["fake_simconnect"] = module
+    spec.loader.exec_module(module)
+    return module
+
+fake_simconnect = _load_fake_simconnect()
+
+BRIDGES = ("pmdg_737_winwing_cdu", "pmdg_777_winwing_cdu")
+BACKEND_BRIDGES = ("pmdg_737_winwing_cdu", "pmdg_777_winwing_cdu", "maddogx_winwing_cdu",
+                   "aerosoft_crj_winwing_cdu", "tfdi_md11_winwing_cdu")
+
+def per_cell_decoder(bridge, lowercase_small: bool) -> Callable[[bytes], str]:
+    """The decoder as it was before the lookup tables, with the bridge's constants."""
+    box = "Ê" if lowercase_small else "ê"
+
+    def create_mobi_json(data: bytes) -> str:
+        message = {
+            "Target": "Display",
+            "Data": [[] for _ in range(bridge.CDU_CELLS)]
+        }
+        for x in range(bridge.CDU_COLUMNS):
+            for y in range(bridge.CDU_ROWS):
+                src_idx = (x * bridge.CDU_ROWS + y) * bridge.CDU_CELL_BYTE_COUNT
+                dst_idx = y * bridge.CDU_COLUMNS + x
+                if src_idx + 2 >= len(data):
+                    message["Data"][dst_idx] = []
+                    continue
+                try:
+                    symbol = chr(data[src_idx])
+                    is_lowercase = lowercase_small and symbol.islower()
+                    if lowercase_small:
+                        symbol = symbol.upper()
+                    color = data[src_idx + 1]
+                    flags = data[src_idx + 2]
+                    if symbol == ' ' or symbol == '\0':
+                        message["Data"][dst_idx] = []
+                    else:
+                        if symbol == '\xA1': symbol = "←"
+                        elif symbol == '\xA2': symbol = "→"
+                        elif symbol == '\xA3': symbol = "↑"
+                        elif symbol == '\xA4': symbol = "↓"
+                        elif symbol == box: symbol = "☐"
+                        if flags & bridge.CDU_FLAG_UNUSED:
+                            color_str = "e"
+                        elif flags & bridge.CDU_FLAG_REVERSE:
+                            color_str = "e"
+                        else:
+                            color_str = {
+                                bridge.CDU_COLOR_WHITE: "w",
+                                bridge.CDU_COLOR_CYAN: "c",
+                                bridge.CDU_COLOR_GREEN: "g",
+                                bridge.CDU_COLOR_MAGENTA: "m",
+                                bridge.CDU_COLOR_AMBER: "a",
+                                bridge.CDU_COLOR_RED: "r"
+                            }.get(color, "w")
+                        message["Data"][dst_idx] = [
+                            symbol,
+                            color_str,
+                            1 if is_lowercase or (flags & bridge.CDU_FLAG_SMALL_FONT) else 0
+                        ]
+                except (ValueError, TypeError, IndexError) as e:
+                    message["Data"][dst_idx] = []
+                    logging.debug(f"Error processing cell: {e}")
+        return json.dumps(message)
+    return create_mobi_json
+
+def synthetic_frames(size: int, count: int, changes: int) -> List[bytes]:
+    rng = random.Random(7)
+    make_cell = lambda rng: bytes((rng.choice(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghij0123456789/-. \xA1\xA2\xEA\xCA"),
+                                   rng.randrange(7), rng.randrange(8)))
+    page = fake_simconnect.changing_frame(size, 3, make_cell, changes)
+    frames = [page(frame) for frame in range(count)]
+    # every byte value in every position, plus truncated buffers
+    frames += [bytes(rng.randrange(256) for _ in range(size)) for _ in range(64)]
+    frames += [frames[-1][:length] for length in (0, 1, 2, 3, 100, size - 1)]
+    return frames
+
+def recorded_frames(path: str, size: int) -> List[bytes]:
+    with open(path, "rb") as file:
+        data = file.read()
+    return [data[offset:offset + size] for offset in range(0, len(data) - size + 1, size)]
+
+def backend_frames(script: str, bridge, count: int, changes: int) -> List[bytes]:
+    """Synthetic recording in the aircraft's layout plus random frames covering every byte value."""
+    rng = random.Random(11)
+    any_byte = lambda rng: rng.randrange(256)
+    printable = lambda rng: rng.choice(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcde0123456789/-.[]{}$!@ ")
+    if script.startswith("pmdg"):
+        size = bridge.CDU_DATA_SIZE
+        cell = lambda rng, symbol: bytes((symbol(rng), rng.randrange(7), rng.randrange(8)))
+        frame = lambda rng, symbol, header: b"".join(cell(rng, symbol) for _ in range(bridge.CDU_CELLS))
+    elif script.startswith("maddogx"):
+        size = bridge.CDU_SC_DATA_SIZE
+        frame = lambda rng, symbol, header: bytes((header,)) + bytes(7) \
+            + bytes(symbol(rng) for _ in range(bridge.CDU_CELLS)) + bytes(any_byte(rng) for _ in range(bridge.CDU_CELLS))
+    elif script.startswith("aerosoft_crj"):
+        size = bridge.CDU_DATA_SIZE
+        frame = lambda rng, symbol, header: b"".join(bytes((symbol(rng), rng.randrange(8) | rng.choice((0, 0x80))))
+                                                     for _ in range(bridge.CDU_CELLS))
+    else:
+        size = bridge.MCDU_DATA_SIZE
+        frame = lambda rng, symbol, header: bytes(4) + b"".join(struct.pack("<HB", symbol(rng), header and any_byte(rng))
+                                                                for _ in range(bridge.MCDU_CHARS))
+    base = frame(rng, printable, 1)
+    page = fake_simconnect.changing_frame(size, 1, lambda rng: bytes((printable(rng),)), changes)
+    frames = [bytes(a if b == 0x20 else b for a, b in zip(base, page(index))) for index in range(count)]
+    wide_symbol = (lambda rng: rng.randrange(1 << 16)) if script.startswith("tfdi") else any_byte
+    frames += [frame(rng, wide_symbol, rng.randrange(3)) for _ in range(64)]
+    frames += [frames[-1][:length] for length in (0, 1, 100, size - 1)][1 if script.startswith("maddogx") else 0:]
+    return frames
+
+def compare_backends(count: int, changes: int):
+    logging.disable(logging.ERROR)  # truncated frames are logged by the MD11 decoder
+    for script in BACKEND_BRIDGES:
+        bridge = fake_simconnect.load_bridge(script)
+        frames = backend_frames(script, bridge, count, changes)
+        for index, frame in enumerate(frames):
+            if bridge.create_mobi_json(frame) != bridge.create_mobi_json_numpy(frame):
+                raise AssertionError(f"{script}: frame {index} decodes differently with NumPy")
+        timings = {}
+        for method, decode in (("python", bridge.create_mobi_json), ("numpy", bridge.create_mobi_json_numpy)):
+            start = perf_counter()
+            for frame in frames:
+                decode(frame)
+            timings[method] = (perf_counter() - start) / len(frames)
+        python, numpy = timings["python"], timings["numpy"]
+        print(f"{script}: {len(frames)} frames, identical output; python {python * 1e6:7.1f} us/frame, "
+              f"numpy {numpy * 1e6:6.1f} us/frame, {python / numpy:5.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the CDU frame decoders of the SimConnect bridges")
+    parser.add_argument("--frames", metavar="FILE", help="recorded CDU buffers for the PMDG comparison")
+    parser.add_argument("--count", type=int, default=2000, help="synthetic frames per aircraft")
+    parser.add_argument("--changes", type=int, default=4, help="cells changing per synthetic frame")
+    arguments = parser.parse_args()
+    count, changes, frames_path = arguments.count, arguments.changes, arguments.frames
+    for script in BRIDGES:
+        bridge = fake_simconnect.load_bridge(script)
+        frames = recorded_frames(frames_path, bridge.CDU_DATA_SIZE) if frames_path \
+            else synthetic_frames(bridge.CDU_DATA_SIZE, count, changes)
+        reference = per_cell_decoder(bridge, lowercase_small=script == "pmdg_777_winwing_cdu")
+        for index, frame in enumerate(frames):
+            if reference(frame) != bridge.create_mobi_json(frame):
+                raise AssertionError(f"{script}: frame {index} decodes differently")
+        timings = {}
+        for method, decode in (("per cell", reference), ("tables", bridge.create_mobi_json)):
+            start = perf_counter()
+            for frame in frames:
+                decode(frame)
+            timings[method] = (perf_counter() - start) / len(frames)
+        per_cell, tables = timings["per cell"], timings["tables"]
+        print(f"{script}: {len(frames)} frames, identical output; per cell {per_cell * 1e6:7.1f} us/frame, "
+              f"tables {tables * 1e6:6.1f} us/frame, {per_cell / tables:5.1f}x")
+    if importlib.util.find_spec("numpy") is None:
+        print("NumPy is not installed, skipping the backend comparison")
+    else:
+        compare_backends(count, changes)
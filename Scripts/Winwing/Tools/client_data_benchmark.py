@@ -0,0 +1,85 @@
+# Benchmark of the two ways the SimConnect bridges copy a CDU buffer out of a client data packet:
+#   per word:  struct.pack("I", dwData[i]) for every 32 bit word, appended to a bytearray (old handlers)
+#   string_at: one ctypes.string_at() over the dwData address (client_data_bytes() in the bridges)
+#
+# Packets use the Windows layout of SIMCONNECT_RECV_CLIENT_DATA (32 bit DWORDs) so the numbers
+# match what the bridges do inside MSFS, whatever OS the benchmark runs on.
+#
+# Usage: python client_data_benchmark.py [--seconds 10] [--rate 60] [--cdus 3]
+
+import argparse
+import ctypes
+import random
+import struct
+from time import perf_counter
+
+# Payload sizes in bytes, as used by the bridges' handle_cdu_data()
+CDU_DATA_SIZES = {
+    "pmdg_737/777": 24 * 14 * 3,
+    "maddogx": 24 * 14 * 2 + 8,
+    "aerosoft_crj": 24 * 14 * 2,
+    "tfdi_md11": 24 * 14 * 3 + 4,
+}
+
+class SIMCONNECT_RECV_CLIENT_DATA_WIN(ctypes.Structure):
+    # SIMCONNECT_RECV + SIMCONNECT_RECV_SIMOBJECT_DATA with Windows' 4 byte DWORD
+    _fields_ = [(name, ctypes.c_uint32) for name in (
+        "dwSize", "dwVersion", "dwID", "dwRequestID", "dwObjectID", "dwDefineID",
+        "dwFlags", "dwentrynumber", "dwoutof", "dwDefineCount")] + [("dwData", ctypes.c_uint32 * 8192)]
+
+HEADER_SIZE = SIMCONNECT_RECV_CLIENT_DATA_WIN.dwData.offset
+
+def extract_per_word(client_data, size: int) -> bytes:
+    int_count = int(size / 4)
+    data_list = bytearray()
+    for i in range(int_count):
+        data_list.extend(struct.pack("I", client_data.dwData[i]))
+    return bytes(data_list)
+
+def extract_string_at(client_data, size: int) -> bytes:
+    size = max(0, min(size, client_data.dwSize - HEADER_SIZE))
+    return ctypes.string_at(ctypes.addressof(client_data.dwData), size)
+
+def make_packets(size: int, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    packets = []
+    for _ in range(count):
+        packet = SIMCONNECT_RECV_CLIENT_DATA_WIN()
+        packet.dwSize = HEADER_SIZE + size
+        payload = bytes(rng.randrange(256) for _ in range(size))
+        ctypes.memmove(ctypes.addressof(packet.dwData), payload, size)
+        packets.append(packet)
+    return packets
+
+def benchmark(seconds: float = 10.0, rate: float = 60.0, cdus: int = 3) -> dict:
+    """Time both extractions for `cdus` CDUs updating at `rate` Hz for `seconds` of sim time."""
+    results = {}
+    packet_count = int(seconds * rate * cdus)
+    for name, size in CDU_DATA_SIZES.items():
+        packets = make_packets(size, 64)
+        for packet in packets:
+            if extract_per_word(packet, size) != extract_string_at(packet, size):
+                raise AssertionError(f"{name}: string_at differs from per-word extraction")
+        timings = {}
+        for method, extract in (("per word", extract_per_word), ("string_at", extract_string_at)):
+            start = perf_counter()
+            for i in range(packet_count):
+                extract(packets[i & 63], size)
+            timings[method] = (perf_counter() - start) / packet_count
+        results[name] = timings
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark copying CDU buffers out of SimConnect client data packets")
+    parser.add_argument("--seconds", type=float, default=10.0, help="simulated seconds of packets")
+    parser.add_argument("--rate", type=float, default=60.0, help="packets per second and CDU")
+    parser.add_argument("--cdus", type=int, default=3, help="number of CDUs")
+    arguments = parser.parse_args()
+    seconds, rate, cdus = arguments.seconds, arguments.rate, arguments.cdus
+    print(f"{cdus} CDUs at {rate:.0f} Hz, {seconds:.0f} s of sim time ({int(seconds * rate * cdus)} packets per decoder)")
+    for name, timings in benchmark(seconds, rate, cdus).items():
+        per_word, string_at = timings["per word"], timings["string_at"]
+        # share of one second of wall clock spent copying buffers at the given update rate
+        load = lambda per_packet: per_packet * rate * cdus * 100.0
+        print(f"{name:>13}: per word {per_word * 1e6:7.1f} us ({load(per_word):5.2f}% CPU), "
+              f"string_at {string_at * 1e6:6.2f} us ({load(string_at):5.3f}% CPU), {per_word / string_at:6.1f}x")
@@ -0,0 +1,559 @@
+# Pure-Python SimConnect stand-in for benchmarking the SimConnect based WinWing bridges on any OS.
+#
+# The bridges subclass SimConnect.SimConnect and call the DLL directly (MapClientDataNameToID,
+# CreateClientData, AddToClientDataDefinition, RequestClientData, SetClientData, CallDispatch).
+# load_bridge() imports a bridge with FakeSimConnect as that base class, so SimConnectMobiFlight
+# runs unchanged against an in-memory simulator that
+#   - emulates the MobiFlight WASM module (<client>.LVars / .Command / .Response areas) and
+#   - emulates aircraft CDU client data areas fed with synthetic frames at configurable rates.
+# With --rebroadcast the simulator ignores SIMCONNECT_CLIENT_DATA_REQUEST_FLAG_CHANGED and sends every
+# frame, as some aircraft do for their CDU areas; the CDU clients then skip the repeated frames.
+# With --frame-commands the WASM module reads each <client>.Command area once per frame, like the real
+# one, so a command overwritten before the next frame is lost; by default commands run when written.
+# Only SimConnect.Enum (ctypes structures and constants) is taken from the real SimConnect package.
+#
+# Usage: python fake_simconnect.py [--seconds 10] [--frame-rate 60] [--changes 4] [--rebroadcast] [--frame-commands] [bridge ...]
+
+import argparse
+import asyncio
+import ctypes
+import importlib.util
+import os
+import random
+import struct
+import sys
+import threading
+import types
+from ctypes import wintypes
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import SimConnect.Enum as SimConnectEnum
+from SimConnect.Enum import (
+    SIMCONNECT_CLIENT_DATA_PERIOD,
+    SIMCONNECT_RECV,
+    SIMCONNECT_RECV_CLIENT_DATA,
+    SIMCONNECT_RECV_ID,
+)
+
+BRIDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENT_DATA_HEADER_SIZE = SIMCONNECT_RECV_CLIENT_DATA.dwData.offset
+DWORD_SIZE = ctypes.sizeof(wintypes.DWORD)
+DEFAULT_AREA_SIZE = 8192
+WASM_STRING_SIZE = 256
+# SIMCONNECT_CLIENTDATATYPE_* sizes -> (bytes, struct format used for the epsilon check)
+CLIENT_DATA_TYPES = {-1: (1, None), -2: (2, None), -3: (4, None), -4: (8, None), -5: (4, "<f"), -6: (8, "<d")}
+
+def _as_int(value) -> int:
+    # SimConnect.Enum mixes IntEnum members with Enum members wrapping ctypes DWORDs
+    while not isinstance(value, int):
+        value = value.value
+    return int(value)
+
+def _constant(expression: str) -> float:
+    # the value the WASM module computes for an RPN constant such as a placeholder; 0 for anything else
+    try:
+        return float(expression)
+    except ValueError:
+        return 0.0
+
+class _DllFunction:
+    """Callable with the argtypes/restype attributes the bridges set on real DLL functions."""
+    def __init__(self, function: Callable):
+        self.function = function
+        self.argtypes = None
+        self.restype = None
+
+    def __call__(self, *args):
+        return self.function(*args)
+
+class ClientDataArea:
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.data = bytearray(size)
+
+    def resize(self, size: int):
+        if size > len(self.data):
+            self.data.extend(bytes(size - len(self.data)))
+
+class ClientDataRequest:
+    def __init__(self, area_id: int, request_id: int, define_id: int, period: int, flags: int):
+        self.area_id = area_id
+        self.request_id = request_id
+        self.define_id = define_id
+        self.period = period
+        self.changed_only = bool(flags & 1)
+        self.last_sent: Optional[bytes] = None
+
+class WasmChannel:
+    """One MobiFlight WASM client: its variables, in slot order, and its areas."""
+    def __init__(self, name: str):
+        self.name = name
+        self.variables: List[str] = []
+
+class FakeSimulator:
+    """In-memory client data areas, definitions and requests shared by one SimConnect handle."""
+    def __init__(self, frame_rate: float = 60.0, rebroadcast: bool = False, frame_commands: bool = False):
+        self.frame_rate = frame_rate
+        self.rebroadcast = rebroadcast  # send unchanged data too, ignoring the changed-only flag
+        self.frame_commands = frame_commands  # run commands in step() instead of when written
+        self.frame = 0
+        self.area_ids: Dict[str, int] = {}
+        self.areas: Dict[int, ClientDataArea] = {}
+        self.definitions: Dict[int, List[Tuple[int, int, Optional[str], float]]] = {}  # offset, size, float format, epsilon
+        self.requests: List[ClientDataRequest] = []
+        self.queue: List[SIMCONNECT_RECV_CLIENT_DATA] = []
+        self.messages_delivered = 0
+        self.bytes_delivered = 0
+        # MobiFlight WASM emulation
+        self.lvar_values: Dict[str, float] = {}
+        self.channels: Dict[str, WasmChannel] = {"MobiFlight": WasmChannel("MobiFlight")}
+        self.commands: List[str] = []
+        self.pending_commands: Dict[str, str] = {}  # channel -> command waiting for the next frame
+        self.commands_lost = 0  # commands overwritten before the WASM module read them
+        # synthetic sources: (area name, rate in Hz, generator(frame) -> bytes)
+        self.sources: List[Tuple[str, float, Callable[[int], bytes]]] = []
+
+    # ---- areas ----
+    def area(self, name: str, size: int = DEFAULT_AREA_SIZE) -> ClientDataArea:
+        area_id = self.area_ids.get(name)
+        if area_id is None:
+            area_id = self.area_ids[name] = max(self.area_ids.values(), default=-1) + 1000
+        if area_id not in self.areas:
+            self.areas[area_id] = ClientDataArea(name, size)
+        return self.areas[area_id]
+
+    def map_name(self, name: str, area_id: int):
+        existing = self.areas.get(self.area_ids.get(name))
+        self.area_ids[name] = area_id
+        if area_id not in self.areas:
+            self.areas[area_id] = existing or ClientDataArea(name, DEFAULT_AREA_SIZE)
+
+    def write(self, area_id: int, offset: int, data: bytes):
+        area = self.areas[area_id]
+        area.resize(offset + len(data))
+        area.data[offset:offset + len(data)] = data
+        for request in self.requests:
+            if request.area_id == area_id and request.period == SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ON_SET:
+                self._queue_request(request)
+        if area.name.endswith(".Command"):
+            channel, command = area.name[:-len(".Command")], bytes(data).split(b"\0", 1)[0].decode("ascii", "replace")
+            if not self.frame_commands:
+                self._handle_wasm_command(channel, command)
+            else:
+                if channel in self.pending_commands:
+                    self.commands_lost += 1
+                self.pending_commands[channel] = command
+
+    def write_named(self, name: str, data: bytes, offset: int = 0):
+        self.area(name)
+        self.write(self.area_ids[name], offset, data)
+
+    # ---- requests ----
+    def _request_bytes(self, request: ClientDataRequest) -> bytes:
+        area = self.areas[request.area_id]
+        return b"".join(bytes(area.data[offset:offset + size]) for offset, size, _, _ in self.definitions.get(request.define_id, []))
+
+    def _changed(self, request: ClientDataRequest, data: bytes) -> bool:
+        # like SimConnect: typed float datums only count as changed when they moved by more than epsilon
+        previous = request.last_sent
+        if previous is None or len(previous) != len(data):
+            return True
+        if data == previous:
+            return False
+        position = 0
+        for _, size, float_format, epsilon in self.definitions.get(request.define_id, []):
+            new, old = data[position:position + size], previous[position:position + size]
+            if new != old and (float_format is None or not epsilon
+                               or abs(struct.unpack(float_format, new)[0] - struct.unpack(float_format, old)[0]) > epsilon):
+                return True
+            position += size
+        return False
+
+    def _queue_request(self, request: ClientDataRequest):
+        data = self._request_bytes(request)
+        if request.changed_only and not self.rebroadcast and not self._changed(request, data):
+            return
+        request.last_sent = data
+        message = SIMCONNECT_RECV_CLIENT_DATA()
+        message.dwSize = CLIENT_DATA_HEADER_SIZE + len(data)
+        message.dwID = SIMCONNECT_RECV_ID.SIMCONNECT_RECV_ID_CLIENT_DATA
+        message.dwRequestID = request.request_id
+        message.dwDefineID = request.define_id
+        message.dwDefineCount = 1
+        # the bridges read dwData word by word; DWORD is 8 bytes wide off Windows, so fill per element
+        data = data.ljust(-(-len(data) // 4) * 4, b"\0")
+        if DWORD_SIZE == 4:
+            ctypes.memmove(ctypes.addressof(message.dwData), data, len(data))
+        else:
+            for index, word in enumerate(struct.unpack(f"<{len(data) // 4}I", data)):
+                message.dwData[index] = word
+        self.queue.append(message)
+
+    def dispatch(self, proc):
+        queue, self.queue = self.queue, []
+        for message in queue:
+            self.messages_delivered += 1
+            self.bytes_delivered += message.dwSize
+            proc(ctypes.cast(ctypes.pointer(message), ctypes.POINTER(SIMCONNECT_RECV)), message.dwSize, None)
+
+    # ---- MobiFlight WASM ----
+    def _respond(self, channel: str, text: str):
+        encoded = text.encode("ascii")[:WASM_STRING_SIZE - 1]
+        self.write_named(channel + ".Response", encoded + bytes(WASM_STRING_SIZE - len(encoded)))
+
+    def _handle_wasm_command(self, channel_name: str, command: str):
+        self.commands.append(command)
+        channel = self.channels.setdefault(channel_name, WasmChannel(channel_name))
+        if command.startswith("MF.SimVars.Add."):
+            name = command[len("MF.SimVars.Add."):]
+            channel.variables.append(name)
+            self._write_lvar(channel, len(channel.variables) - 1, self.lvar_values.setdefault(name, _constant(name)))
+        elif command == "MF.SimVars.Clear":
+            channel.variables.clear()
+        elif command.startswith("MF.SimVars.Set."):
+            pass  # RPN writes are accepted and ignored
+        elif command == "MF.Ping":
+            self._respond(channel_name, "MF.Pong")
+        elif command.startswith("MF.Clients.Add."):
+            client = command[len("MF.Clients.Add."):]
+            self.channels.setdefault(client, WasmChannel(client))
+            self._respond(channel_name, f"MF.Clients.Add.{client}.Finished")
+
+    def _write_lvar(self, channel: WasmChannel, slot: int, value: float):
+        name = channel.name + ".LVars"
+        if name in self.area_ids:
+            self.write(self.area_ids[name], slot * 4, struct.pack("<f", value))
+
+    def set_lvar(self, name: str, value: float):
+        self.lvar_values[name] = value
+        for channel in self.channels.values():
+            for slot, variable in enumerate(channel.variables):
+                if variable == name:
+                    self._write_lvar(channel, slot, value)
+
+    # ---- synthetic frames ----
+    def add_source(self, area_name: str, rate: float, generator: Callable[[int], bytes], size: int = DEFAULT_AREA_SIZE):
+        self.area(area_name, size)
+        self.sources.append((area_name, rate, generator))
+
+    def step(self):
+        """Advance one simulator visual frame: run due sources and serve VISUAL_FRAME/SECOND requests."""
+        self.frame += 1
+        pending, self.pending_commands = self.pending_commands, {}
+        for channel, command in pending.items():
+            self._handle_wasm_command(channel, command)
+        for area_name, rate, generator in self.sources:
+            every = max(1, round(self.frame_rate / rate))
+            if self.frame % every == 0:
+                area_id = self.area_ids[area_name]
+                area = self.areas[area_id]
+                data = generator(self.frame)
+                area.resize(len(data))
+                area.data[:len(data)] = data
+                for request in self.requests:
+                    if request.area_id == area_id and request.period == SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ON_SET:
+                        self._queue_request(request)
+        second = self.frame % max(1, round(self.frame_rate)) == 0
+        for request in self.requests:
+            if request.period == SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_VISUAL_FRAME \
+                    or (second and request.period == SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_SECOND):
+                self._queue_request(request)
+
+class FakeSimConnectDll:
+    def __init__(self, simulator: FakeSimulator):
+        sim = simulator
+
+        def map_client_data_name_to_id(handle, name, area_id):
+            sim.map_name(name.decode("ascii") if isinstance(name, bytes) else str(name), _as_int(area_id))
+            return 0
+
+        def create_client_data(handle, area_id, size, flags):
+            sim.areas[_as_int(area_id)].resize(_as_int(size))
+            return 0
+
+        def add_to_client_data_definition(handle, define_id, offset, size, epsilon=0, datum_id=0):
+            size, float_format = CLIENT_DATA_TYPES.get(ctypes.c_int32(_as_int(size)).value, (_as_int(size), None))
+            sim.definitions.setdefault(_as_int(define_id), []).append((_as_int(offset), size, float_format, float(epsilon)))
+            return 0
+
+        def clear_client_data_definition(handle, define_id):
+            sim.definitions.pop(_as_int(define_id), None)
+            return 0
+
+        def request_client_data(handle, area_id, request_id, define_id, period, flags=0, origin=0, interval=0, limit=0):
+            request_id, period = _as_int(request_id), _as_int(period)
+            sim.requests = [request for request in sim.requests if request.request_id != request_id]
+            if period != SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_NEVER:
+                request = ClientDataRequest(_as_int(area_id), request_id, _as_int(define_id), period, _as_int(flags))
+                sim.requests.append(request)
+                if period == SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ONCE:
+                    sim._queue_request(request)
+                    sim.requests.remove(request)
+            return 0
+
+        def set_client_data(handle, area_id, define_id, flags, reserved, size, data):
+            size = _as_int(size)
+            payload = data if isinstance(data, (bytes, bytearray)) else ctypes.string_at(data, size)
+            offset = sim.definitions.get(_as_int(define_id), [(0, size, None, 0.0)])[0][0]
+            sim.write(_as_int(area_id), offset, bytes(payload[:size]))
+            return 0
+
+        def call_dispatch(handle, proc, context):
+            sim.dispatch(proc)
+            return 0
+
+        self.MapClientDataNameToID = _DllFunction(map_client_data_name_to_id)
+        self.CreateClientData = _DllFunction(create_client_data)
+        self.AddToClientDataDefinition = _DllFunction(add_to_client_data_definition)
+        self.ClearClientDataDefinition = _DllFunction(clear_client_data_definition)
+        self.RequestClientData = _DllFunction(request_client_data)
+        self.SetClientData = _DllFunction(set_client_data)
+        self.CallDispatch = _DllFunction(call_dispatch)
+        self.Close = _DllFunction(lambda handle: 0)
+
+class FakeSimConnect:
+    """Replacement for SimConnect.SimConnect: same attributes the bridges use, no DLL, no thread."""
+    frame_rate: float = 60.0
+    rebroadcast: bool = False
+    frame_commands: bool = False
+
+    def __init__(self, auto_connect=True, library_path=None):
+        self.simulator = FakeSimulator(self.frame_rate, self.rebroadcast, self.frame_commands)
+        self.dll = FakeSimConnectDll(self.simulator)
+        self.hSimConnect = ctypes.c_void_p(1)
+        self.quit = 0
+        self.ok = True
+        self.my_dispatch_proc_rd = self.my_dispatch_proc
+
+    def my_dispatch_proc(self, pData, cbData, pContext):
+        pass  # only client data is emulated
+
+    def dispatch(self):
+        """One pump cycle, as SimConnect.SimConnect._run (or a bridge's override) would do it."""
+        self.dll.CallDispatch(self.hSimConnect, self.my_dispatch_proc_rd, None)
+        for handler in getattr(self, "dispatch_complete_handlers", ()):
+            handler()
+
+    def exit(self):
+        self.quit = 1
+
+def load_bridge(script: str) -> types.ModuleType:
+    """Import a bridge script (file name with or without .py) on top of FakeSimConnect."""
+    path = script if os.path.isabs(script) else os.path.join(BRIDGE_DIR, script if script.endswith(".py") else script + ".py")
+    fake_package = types.ModuleType("SimConnect")
+    fake_package.SimConnect = FakeSimConnect
+    fake_package.Enum = SimConnectEnum
+    fake_package.__path__ = []
+    real_package = sys.modules.get("SimConnect")
+    sys.modules["SimConnect"] = fake_package
+    try:
+        name = "bridge_" + os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        if real_package is not None:
+            sys.modules["SimConnect"] = real_package
+
+# ========================= Synthetic frame generators =========================
+def changing_frame(size: int, cell_bytes: int, make_cell: Callable[[random.Random], bytes], changes: int,
+                   header: bytes = b"", seed: int = 1) -> Callable[[int], bytes]:
+    """Generator for a CDU buffer where `changes` random cells are rewritten every frame."""
+    rng = random.Random(seed)
+    cells = bytearray(b"".join(make_cell(rng) for _ in range(336)))
+    body_size = size - len(header)
+
+    def generate(frame: int) -> bytes:
+        for _ in range(changes):
+            index = rng.randrange(336) * cell_bytes
+            cells[index:index + cell_bytes] = make_cell(rng)
+        return header + bytes(cells[:body_size]).ljust(body_size, b"\0")
+    return generate
+
+def _printable(rng: random.Random) -> int:
+    return rng.choice(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789/-. ")
+
+# ========================= Benchmarks =========================
+class _BackgroundLoop:
+    """asyncio loop on a thread, standing in for the loop the bridges hand frames to."""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        async def cancel_tasks():
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+        asyncio.run_coroutine_threadsafe(cancel_tasks(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+class _NullWebSocket:
+    """Connected MobiFlight websocket that discards every frame."""
+    async def send(self, data):
+        pass
+
+def _cdu_clients(bridge, sm, client_class: str, areas: List[Tuple], loop) -> list:
+    clients = []
+    for args in areas:
+        client = getattr(bridge, client_class)(sm, "ws://127.0.0.1:1/unused", *args)
+        # frames dropped while disconnected are let through again, so the clients need a connection
+        client.mobiflight.websocket = _NullWebSocket()
+        client.mobiflight.connected.set()
+        client.event_loop = loop.loop
+        client.mailbox.loop = loop.loop
+        client.setup_simconnect()
+        asyncio.run_coroutine_threadsafe(client.send_frames(), loop.loop)
+        clients.append(client)
+    return clients
+
+def setup_pmdg(script: str, changes: int, rate: float):
+    bridge = load_bridge(script)
+    sm = bridge.SimConnectMobiFlight()
+    size = bridge.CDU_CELLS * bridge.CDU_CELL_BYTE_COUNT
+    areas = [(getattr(bridge, f"PMDG_CDU_{i}_NAME"), getattr(bridge, f"PMDG_CDU_{i}_ID"), getattr(bridge, f"PMDG_CDU_{i}_DEFINITION"))
+             for i in range(3) if hasattr(bridge, f"PMDG_CDU_{i}_NAME")]
+    make_cell = lambda rng: bytes((_printable(rng), rng.randrange(6), rng.randrange(2)))
+    for index, (name, _, _) in enumerate(areas):
+        sm.simulator.add_source(name, rate, changing_frame(size, 3, make_cell, changes, seed=index), size)
+    return bridge, sm, ("PMDGCDUClient", areas)
+
+def setup_maddogx(changes: int, rate: float):
+    bridge = load_bridge("maddogx_winwing_cdu")
+    sm = bridge.SimConnectMobiFlight()
+    areas = [(bridge.MDX_CDU_0_NAME, bridge.MDX_CDU_0_ID, bridge.MDX_CDU_0_DEFINITION),
+             (bridge.MDX_CDU_1_NAME, bridge.MDX_CDU_1_ID, bridge.MDX_CDU_1_DEFINITION)]
+    for index, (name, _, _) in enumerate(areas):
+        # screen plane then attribute plane; a cell here is one byte in each plane
+        screen = changing_frame(bridge.CDU_CELLS, 1, lambda rng: bytes((_printable(rng),)), changes, seed=index)
+        attributes = changing_frame(bridge.CDU_CELLS, 1, lambda rng: bytes((rng.randrange(8) | rng.choice((0, 0x80)),)), changes, seed=index + 10)
+        header = bytes((1, 0, 0, 0, 0, 0, 0, 0))
+        sm.simulator.add_source(name, rate, lambda frame, s=screen, a=attributes: header + s(frame) + a(frame), bridge.CDU_SC_DATA_SIZE)
+    return bridge, sm, ("MDXCDUClient", areas)
+
+def setup_crj(changes: int, rate: float):
+    bridge = load_bridge("aerosoft_crj_winwing_cdu")
+    sm = bridge.SimConnectMobiFlight()
+    size = bridge.CDU_CELLS * bridge.CDU_CELL_BYTE_COUNT
+    areas = [(bridge.CRJ_CDU_0_NAME, bridge.CRJ_CDU_0_CLIENT_DATA_ID, bridge.CRJ_CDU_0_DEFINITION),
+             (bridge.CRJ_CDU_1_NAME, bridge.CRJ_CDU_1_CLIENT_DATA_ID, bridge.CRJ_CDU_1_DEFINITION)]
+    make_cell = lambda rng: bytes((_printable(rng), rng.randrange(8) | rng.choice((0, 0x80))))
+    for index, (name, _, _) in enumerate(areas):
+        sm.simulator.add_source(name, rate, changing_frame(size, 2, make_cell, changes, seed=index), size)
+    return bridge, sm, ("CRJCDUClient", areas)
+
+def setup_md11(changes: int, rate: float):
+    bridge = load_bridge("tfdi_md11_winwing_cdu")
+    sm = bridge.SimConnectMobiFlight()
+    size = bridge.MCDU_DATA_SIZE
+    make_cell = lambda rng: struct.pack("<H?", _printable(rng), rng.random() < 0.5)
+    screens = [changing_frame(size, 3, make_cell, changes, header=bytes(4), seed=index) for index in range(3)]
+    # all three MCDUs live in one area, one MCDU_DATA_SIZE block each
+    sm.simulator.add_source(bridge.MD11_MCDU_NAME, rate, lambda frame: b"".join(screen(frame) for screen in screens), size * 3)
+    areas = [(bridge.MD11_MCDU_LEFT_DEFINITION,), (bridge.MD11_MCDU_CENTER_DEFINITION,), (bridge.MD11_MCDU_RIGHT_DEFINITION,)]
+    return bridge, sm, ("MD11CDUClient", areas)
+
+def benchmark_cdu_bridge(name: str, setup: Callable, seconds: float, frame_rate: float, changes: int) -> dict:
+    FakeSimConnect.frame_rate = frame_rate
+    bridge, sm, (client_class, areas) = setup(changes, frame_rate)
+    loop = _BackgroundLoop()
+    try:
+        clients = _cdu_clients(bridge, sm, client_class, areas, loop)
+        frames = int(seconds * frame_rate)
+        start = perf_counter()
+        for _ in range(frames):
+            sm.simulator.step()
+            sm.dispatch()
+        elapsed = perf_counter() - start
+    finally:
+        loop.close()
+    result = _result(name, sm, frames, elapsed)
+    result["unique_frames"] = sum(client.unique_frames for client in clients)
+    result["duplicate_frames"] = sum(client.duplicate_frames for client in clients)
+    result["coalesced_frames"] = sum(client.mailbox.coalesced for client in clients)
+    return result
+
+def benchmark_ec135(seconds: float, frame_rate: float, changes: int, block_subscription: bool = True) -> dict:
+    FakeSimConnect.frame_rate = frame_rate
+    bridge = load_bridge("microsoft_aircraft_ec135")
+    bridge.BLOCK_SUBSCRIPTION = block_subscription
+    sm = bridge.SimConnectMobiFlight()
+    vr = bridge.MobiFlightVariableRequests(sm)
+    table = bridge.load_annunciator_table()
+    vr.clear_sim_variables()
+    vr.register(table.all_lvars, default=0.0)
+    # commands are written one by one by the bridge's command thread, acknowledged via dispatch
+    while not vr.commands.wait_until_idle(0.001):
+        sm.simulator.step()
+        sm.dispatch()
+    sm.dispatch()
+    rng = random.Random(1)
+    frames = int(seconds * frame_rate)
+    start = perf_counter()
+    for _ in range(frames):
+        for _ in range(changes):
+            sm.simulator.set_lvar(rng.choice(table.lvars), float(rng.randrange(2)))
+        sm.simulator.step()
+        sm.dispatch()
+        snapshot = vr.snapshot()
+        bridge.render_cas_frame(table, table.evaluate([snapshot.values[i] for i in vr.indices(table.lvars)]), 0)
+    elapsed = perf_counter() - start
+    name = "microsoft_aircraft_ec135" + ("" if block_subscription else " (per variable)")
+    return _result(name, sm, frames, elapsed)
+
+def _result(name: str, sm: FakeSimConnect, frames: int, elapsed: float) -> dict:
+    simulator = sm.simulator
+    handler_stats = getattr(sm, "client_data_stats", {}).values()
+    return {
+        "bridge": name,
+        "sim_frames": frames,
+        "messages": simulator.messages_delivered,
+        "elapsed_s": elapsed,
+        "us_per_message": elapsed / simulator.messages_delivered * 1e6 if simulator.messages_delivered else 0.0,
+        "sim_frames_per_s": frames / elapsed if elapsed else 0.0,
+        "handler_calls": sum(stats.calls for stats in handler_stats),
+        "handler_s": sum(stats.seconds for stats in handler_stats),
+    }
+
+BENCHMARKS = {
+    "pmdg_737": lambda s, r, c: benchmark_cdu_bridge("pmdg_737", lambda c_, r_: setup_pmdg("pmdg_737_winwing_cdu", c_, r_), s, r, c),
+    "pmdg_777": lambda s, r, c: benchmark_cdu_bridge("pmdg_777", lambda c_, r_: setup_pmdg("pmdg_777_winwing_cdu", c_, r_), s, r, c),
+    "maddogx": lambda s, r, c: benchmark_cdu_bridge("maddogx", setup_maddogx, s, r, c),
+    "aerosoft_crj": lambda s, r, c: benchmark_cdu_bridge("aerosoft_crj", setup_crj, s, r, c),
+    "tfdi_md11": lambda s, r, c: benchmark_cdu_bridge("tfdi_md11", setup_md11, s, r, c),
+    "ec135": benchmark_ec135,
+    "ec135_per_variable": lambda s, r, c: benchmark_ec135(s, r, c, block_subscription=False),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SimConnect bridges against an in-memory simulator")
+    parser.add_argument("bridges", nargs="*", metavar="bridge",
+                        help=f"bridges to benchmark (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--seconds", type=float, default=10.0, help="simulated seconds per bridge")
+    parser.add_argument("--frame-rate", type=float, default=60.0, help="simulator frames per second")
+    parser.add_argument("--changes", type=int, default=4, help="changed cells/LVARs per frame")
+    parser.add_argument("--rebroadcast", action="store_true", help="send unchanged CDU frames every frame")
+    parser.add_argument("--frame-commands", action="store_true", help="read MobiFlight commands once per frame")
+    arguments = parser.parse_args()
+    unknown = [name for name in arguments.bridges if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown bridge {unknown[0]!r} (choose from {', '.join(BENCHMARKS)})")
+    seconds, frame_rate, changes = arguments.seconds, arguments.frame_rate, arguments.changes
+    FakeSimConnect.rebroadcast = arguments.rebroadcast
+    FakeSimConnect.frame_commands = arguments.frame_commands
+    selected = arguments.bridges or list(BENCHMARKS)
+    print(f"{seconds:.0f} s of simulated time at {frame_rate:.0f} frames/s, {changes} changed cells/LVARs per frame"
+          + (", unchanged frames re-broadcast" if FakeSimConnect.rebroadcast else "")
+          + (", commands read once per frame" if FakeSimConnect.frame_commands else ""))
+    for name in selected:
+        result = BENCHMARKS[name](seconds, frame_rate, changes)
+        print(f"{result['bridge']:>26}: {result['messages']:6d} messages in {result['elapsed_s']:6.2f} s, "
+              f"{result['us_per_message']:8.1f} us/message, {result['sim_frames_per_s']:8.0f} sim frames/s, "
+              f"{result['handler_calls']:6d} handler calls taking {result['handler_s'] * 1e3:7.1f} ms"
+              + (f", {result['unique_frames']} unique / {result['duplicate_frames']} duplicate / "
+                 f"{result['coalesced_frames']} coalesced frames"
+                 if "unique_frames" in result else ""))
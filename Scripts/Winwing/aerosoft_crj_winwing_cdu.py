@@ -2,18 +2,49 @@ from ctypes import wintypes
 import ctypes
 import json
 import struct
+import threading
+from time import perf_counter
 import logging
 import asyncio
 import websockets.asyncio.client as ws_client
 from typing import Optional, List, Dict, Union, Any
+try:
+    import numpy as np  # optional, enables create_mobi_json_numpy()
+except ImportError:
+    np = None
 from SimConnect import SimConnect, Enum
 from SimConnect.Enum import SIMCONNECT_CLIENT_DATA_ID, SIMCONNECT_RECV_ID, SIMCONNECT_RECV_CLIENT_DATA
 
 
+class ClientDataHandlerStats:
+    """Call count and time spent in one client data handler."""
+    __slots__ = ("name", "define_ids", "calls", "seconds", "max_seconds")
+
+    def __init__(self, handler):
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.define_ids = []
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def __str__(self):
+        average = self.seconds / self.calls * 1e6 if self.calls else 0.0
+        routes = self.define_ids or "all"
+        return f"{self.name} (define ids {routes}): {self.calls} calls, avg {average:.1f} us, max {self.max_seconds * 1e6:.1f} us"
+
+
 class SimConnectMobiFlight(SimConnect):
 
     def __init__(self, auto_connect=True, library_path=None):
-        self.client_data_handlers = []
+        self.client_data_handlers = []  # catch-all, for packets whose define id has no route
+        self.client_data_routes = {}    # dwDefineID -> [handler, ...]
+        self.client_data_stats = {}     # handler -> ClientDataHandlerStats
         if library_path:
             super().__init__(auto_connect, library_path)
         else:
@@ -22,28 +53,64 @@ class SimConnectMobiFlight(SimConnect):
         self.dll.MapClientDataNameToID.argtypes = [wintypes.HANDLE, ctypes.c_char_p, SIMCONNECT_CLIENT_DATA_ID]
 
 
-    def register_client_data_handler(self, handler):
-        if not handler in self.client_data_handlers:
+    def register_client_data_handler(self, handler, define_id=None):
+        # with a define_id the handler only gets packets of that definition (one dict lookup per
+        # packet); without one it is a catch-all for packets no routed handler is registered for
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.setdefault(define_id, [])
+        if handler not in handlers:
             logging.info("Register new client data handler")
-            self.client_data_handlers.append(handler)
+            handlers.append(handler)
+            stats = self.client_data_stats.setdefault(handler, ClientDataHandlerStats(handler))
+            if define_id is not None:
+                stats.define_ids.append(define_id)
 
 
-    def unregister_client_data_handler(self, handler):
-        if handler in self.client_data_handlers:
+    def unregister_client_data_handler(self, handler, define_id=None):
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.get(define_id, [])
+        if handler in handlers:
             logging.info("Unregister client data handler")
-            self.client_data_handlers.remove(handler)
+            handlers.remove(handler)
+            if define_id is not None and not handlers:
+                del self.client_data_routes[define_id]
+
+
+    def log_client_data_stats(self):
+        for stats in self.client_data_stats.values():
+            logging.info("Client data handler %s", stats)
 
 
     def my_dispatch_proc(self, pData, cbData, pContext):
         dwID = pData.contents.dwID
         if dwID == SIMCONNECT_RECV_ID.SIMCONNECT_RECV_ID_CLIENT_DATA:
             client_data = ctypes.cast(pData, ctypes.POINTER(SIMCONNECT_RECV_CLIENT_DATA)).contents
-            for handler in self.client_data_handlers:
-                handler(client_data)
+            self.dispatch_client_data(client_data)
         else:
             super().my_dispatch_proc(pData, cbData, pContext)
 
 
+    def dispatch_client_data(self, client_data):
+        handlers = self.client_data_routes.get(client_data.dwDefineID, self.client_data_handlers)
+        for handler in handlers:
+            start = perf_counter()
+            handler(client_data)
+            self.client_data_stats[handler].record(perf_counter() - start)
+
+
+# Size of the SIMCONNECT_RECV_CLIENT_DATA header in front of dwData
+CLIENT_DATA_HEADER_SIZE: int = SIMCONNECT_RECV_CLIENT_DATA.dwData.offset
+DWORD_SIZE: int = ctypes.sizeof(wintypes.DWORD)
+
+
+def client_data_bytes(client_data: Any, size: int) -> bytes:
+    """Up to `size` bytes of a client data packet's payload, copied out of dwData in one go."""
+    size = max(0, min(size, client_data.dwSize - CLIENT_DATA_HEADER_SIZE))
+    if DWORD_SIZE == 4:
+        return ctypes.string_at(ctypes.addressof(client_data.dwData), size)
+    # DWORD is 8 bytes wide off Windows (e.g. under Tools/fake_simconnect.py): one value per element
+    words = -(-size // 4)
+    return struct.pack(f"{words}I", *client_data.dwData[:words])[:size]
+
+
 subs = {'@': '☐',    # ballot box \u2610
         'a': '↑',    # up arrow    \u2191
         'b': '↓',    # down arrow  \u2193
@@ -59,6 +126,7 @@ CDU_COLUMNS: int = 24
 CDU_ROWS: int = 14
 CDU_CELLS: int = CDU_COLUMNS * CDU_ROWS
 CDU_CELL_BYTE_COUNT = 2
+CDU_DATA_SIZE: int = CDU_CELLS * CDU_CELL_BYTE_COUNT
 
 # CDU Color constants
 CDU_COLOR_BLACK: int = 0
@@ -114,9 +182,12 @@ class MobiFlightClient:
 
 
 
-    async def send(self, data: str) -> None:
+    async def send(self, data: str) -> bool:
+        # False when the frame was dropped because MobiFlight is not connected
         if self.websocket and self.connected.is_set():
             await self.websocket.send(data)
+            return True
+        return False
 
     async def close(self) -> None:
         if self.websocket:
@@ -173,6 +244,108 @@ def create_mobi_json(data: bytes) -> str:
     return json.dumps(message)                
 
 
+# NumPy backend (pip install numpy): the buffer is viewed as an array of cells and mapped through
+# lookup arrays to indices into CDU_CELL_JSON, the JSON of every symbol x style combination
+if np is not None:
+    CDU_CELL_DTYPE = np.dtype([("symbol", np.uint8), ("format", np.uint8)])
+    CDU_COLOR_CODES: Dict[int, str] = {
+        CDU_COLOR_BLACK: "e",  # use grey instead
+        CDU_COLOR_WHITE: "w",
+        CDU_COLOR_RED: "r",
+        CDU_COLOR_GREEN: "g",
+        CDU_COLOR_BLUE: "o",
+        CDU_COLOR_CYAN: "o", # is shown as blue on CDU
+        CDU_COLOR_MAGENTA: "m",
+        CDU_COLOR_YELLOW: "y"
+    }
+    CDU_COLOR_STRINGS: List[str] = ["w", "e", "r", "g", "o", "m", "y"]
+    # style index = colour index * 2 + small
+    CDU_STYLES: List[str] = [f', "{color_str}", {small}]' for color_str in CDU_COLOR_STRINGS for small in (0, 1)]
+    CDU_COLOR_INDEX = np.array([CDU_COLOR_STRINGS.index(CDU_COLOR_CODES.get(fmt & 0b01111111, "w")) for fmt in range(256)], dtype=np.intp)
+    # heading lines are small as well, except the input line
+    CDU_ROW_SMALL = np.array([1 if (y % 2 == 1) and not (y == 13) else 0
+                              for y in range(CDU_ROWS) for x in range(CDU_COLUMNS)], dtype=np.intp)
+
+    def _symbol_json(code: int) -> Optional[str]:
+        symbol: str = subs.get(chr(code), chr(code))
+        if symbol == ' ' or symbol == '\0':
+            return None
+        return "[" + json.dumps(symbol)
+
+    CDU_CELL_JSON = np.array(["[]" if symbol is None else symbol + style
+                              for symbol in (_symbol_json(code) for code in range(256)) for style in CDU_STYLES], dtype=object)
+else:
+    CDU_CELL_DTYPE = CDU_STYLES = CDU_COLOR_INDEX = CDU_ROW_SMALL = CDU_CELL_JSON = None  # create_mobi_json_numpy() is only used with NumPy
+
+
+def create_mobi_json_numpy(data: bytes) -> str:
+    # same output as create_mobi_json(), which also handles short buffers
+    if len(data) < CDU_DATA_SIZE:
+        return create_mobi_json(data)
+    cells = np.frombuffer(data, CDU_CELL_DTYPE, CDU_CELLS)
+    symbols = cells["symbol"].astype(np.intp)
+    formats = cells["format"].astype(np.intp)
+    styles = CDU_COLOR_INDEX[formats] * 2 + (formats >> 7 | CDU_ROW_SMALL)
+    return '{"Target": "Display", "Data": [' + ", ".join(CDU_CELL_JSON[symbols * len(CDU_STYLES) + styles].tolist()) + "]}"
+
+# Encoder used by the CDU client: the NumPy backend when NumPy is installed
+mobi_json_encoder = create_mobi_json_numpy if np is not None else create_mobi_json
+
+
+class FrameMailbox:
+    """Latest-wins, single-slot hand-over of CDU frames from the SimConnect thread to the event loop.
+
+    post() overwrites a frame the sender has not taken yet, so a WebSocket slower than the sim makes
+    the display skip frames instead of queueing them and falling further and further behind.
+    """
+    def __init__(self) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._frame: Optional[bytes] = None
+        self._pending_since: float = 0.0
+        self._ready: asyncio.Event = asyncio.Event()
+        self.posted: int = 0
+        self.coalesced: int = 0      # frames overwritten before the sender took them
+        self.taken: int = 0
+        self.total_age: float = 0.0  # seconds the slot was pending when taken, summed
+        self.max_age: float = 0.0
+
+    def post(self, frame: bytes) -> None:
+        # SimConnect thread: one lock and, only when the slot was empty, one wake-up of the sender
+        with self._lock:
+            wake: bool = self._frame is None
+            if wake:
+                self._pending_since = perf_counter()
+            else:
+                self.coalesced += 1
+            self._frame = frame
+            self.posted += 1
+        if wake and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def get(self) -> bytes:
+        while True:
+            with self._lock:
+                frame, self._frame = self._frame, None
+                if frame is not None:
+                    age: float = perf_counter() - self._pending_since
+                    self.taken += 1
+                    self.total_age += age
+                    self.max_age = max(self.max_age, age)
+                    return frame
+                self._ready.clear()
+            await self._ready.wait()
+
+    def age(self) -> float:
+        """Seconds the oldest frame not yet sent has been waiting, 0 when the slot is empty."""
+        with self._lock:
+            return perf_counter() - self._pending_since if self._frame is not None else 0.0
+
+    def __str__(self) -> str:
+        average = self.total_age / self.taken * 1e3 if self.taken else 0.0
+        return (f"{self.posted} frames posted, {self.coalesced} coalesced, {self.taken} sent, "
+                f"queue age avg {average:.2f} ms, max {self.max_age * 1e3:.2f} ms")
+
 class CRJCDUClient:
     def __init__(self, sc_mobiflight: SimConnectMobiFlight, websocket_uri: str, cdu_name: str, cdu_id: int, cdu_definition: int) -> None:
         self.sc_mobiflight: SimConnectMobiFlight = sc_mobiflight
@@ -181,6 +354,10 @@ class CRJCDUClient:
         self.cdu_definition: int = cdu_definition
         self.cdu_name: str = cdu_name
         self.cdu_id: int = cdu_id
+        self.last_data: Optional[bytes] = None
+        self.unique_frames: int = 0       # frames that differed from the previous one
+        self.duplicate_frames: int = 0    # frames identical to the previous one, skipped
+        self.mailbox: FrameMailbox = FrameMailbox()
 
     def failed_to_connect(self) -> bool:
         return self.mobiflight.retries >= self.mobiflight.max_retries
@@ -215,7 +392,7 @@ class CRJCDUClient:
             )
 
             # Set up the handler
-            self.sc_mobiflight.register_client_data_handler(self.handle_cdu_data)
+            self.sc_mobiflight.register_client_data_handler(self.handle_cdu_data, self.cdu_definition)
             logging.info("SimConnect initialized for %s", self.cdu_name)
             return True
         except Exception as e:
@@ -223,23 +400,43 @@ class CRJCDUClient:
             return False
     
 
+    def log_frame_stats(self) -> None:
+        logging.info("%s: %d unique CDU frames, %d duplicate frames skipped",
+                     self.cdu_name, self.unique_frames, self.duplicate_frames)
+        logging.info("%s: %s", self.cdu_name, self.mailbox)
+
     def handle_cdu_data(self, client_data: Any) -> None:
         try:
             if client_data.dwDefineID == self.cdu_definition and hasattr(client_data, 'dwData'):                
-                int_count : int = int(CDU_COLUMNS * CDU_ROWS * CDU_CELL_BYTE_COUNT / 4)              
-                if len(client_data.dwData) >= int_count:
-                    data_list : bytearray = bytearray()                  
-                    for i in range(int_count): 
-                        my_bytes : bytes = struct.pack("I", client_data.dwData[i])
-                        data_list.extend(my_bytes)                
-                    data: bytes = bytes(data_list)                                       
-                    asyncio.run_coroutine_threadsafe(self.mobiflight.send(create_mobi_json(data)), self.event_loop)
+                data: bytes = client_data_bytes(client_data, CDU_DATA_SIZE)
+                if len(data) == CDU_DATA_SIZE:
+                    # Only decode and send if data has changed; a re-broadcast frame costs one bytes compare
+                    if data == self.last_data:
+                        self.duplicate_frames += 1
+                        return
+                    self.last_data = data
+                    self.unique_frames += 1
+                    self.mailbox.post(data)
         except Exception as e:
             logging.error(f"Error handling CDU data: {e}")
 
 
+    async def send_frames(self) -> None:
+        # Decodes and sends only the newest frame handle_cdu_data posted to the mailbox
+        while True:
+            data: bytes = await self.mailbox.get()
+            try:
+                sent: bool = await self.mobiflight.send(mobi_json_encoder(data))
+            except Exception as e:
+                logging.error(f"Error sending CDU data: {e}")
+                sent = False
+            if not sent:
+                # the display never got this frame: let the next re-broadcast of it through
+                self.last_data = None
+
     async def run(self) -> None:
         self.event_loop = asyncio.get_running_loop()
+        self.mailbox.loop = self.event_loop
         logging.info("Starting CDU client")
         
         try:
@@ -251,8 +448,10 @@ class CRJCDUClient:
                 return
 
             # Initialize SimConnect
-            if self.setup_simconnect():               
+            if self.setup_simconnect():
+                sender_task: asyncio.Task = asyncio.create_task(self.send_frames())
                 await asyncio.gather(mobiflight_task)
+                sender_task.cancel()
             else:
                 logging.error("Failed to start - SimConnect initialization failed")
         except KeyboardInterrupt:
@@ -287,4 +486,7 @@ if __name__ == "__main__":
     except Exception as e:
         logging.error(f"Error: {e}")
     finally:
+        sc_mobiflight.log_client_data_stats()
+        captain_client.log_frame_stats()
+        co_pilot_client.log_frame_stats()
         sc_mobiflight.exit()
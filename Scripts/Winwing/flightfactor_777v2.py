@@ -21,8 +21,11 @@ The failed message is picked back up and dispatched to MobiFlight. This ensures
 
 import asyncio
 import base64
+import concurrent.futures
 import json
 import logging
+import os
+import urllib.parse
 import urllib.request
 import websockets
 from enum import StrEnum
@@ -36,6 +39,12 @@ WEBSOCKET_PORT = 8320
 
 BASE_REST_URL = "http://localhost:8086/api/v2/datarefs"
 BASE_WEBSOCKET_URI = f"ws://{WEBSOCKET_HOST}:8086/api/v2"
+CAPABILITIES_URL = "http://localhost:8086/api/capabilities"
+AIRCRAFT_PATH_DATAREF = "sim/aircraft/view/acf_relative_path"
+
+DATAREF_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flightfactor_777v2.datarefs.json")
+# longest filter[name] query string per request when resolving cached names; proxies and servers cap URLs
+DATAREF_QUERY_MAX_LENGTH = 4000
 
 WS_CAPTAIN = f"ws://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/winwing/cdu-captain"
 WS_CO_PILOT = f"ws://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/winwing/cdu-co-pilot"
@@ -97,19 +106,156 @@ def get_size(size: int) -> int:
     return 1 if size == 2 else 0
 
 
-def fetch_dataref_mapping(device: CduDevice):
-    with urllib.request.urlopen(BASE_REST_URL, timeout=5) as response:
-        response_json = json.load(response)
+class DatarefIndex:
+    """
+    Dataref name -> id index shared by all CDU devices.
+
+    X-Plane's full dataref list has tens of thousands of entries. It is fetched once, on a worker thread so the
+    event loop keeps running, and only the datarefs containing one of the devices' symbol datarefs are kept, so
+    each device searches a few hundred names instead of the whole list.
+    The names are cached on disk per X-Plane build and loaded aircraft, keeping only the newest entry per aircraft.
+    On a cache hit only those names are requested, with the server-side name filter; ids are not reused as they
+    can change between X-Plane sessions. Without a cache_file the list is fetched with a single request.
+    """
 
-        return dict(
-            map(
-                lambda dataref: (int(dataref["id"]), str(dataref["name"]).strip()),
-                filter(
-                    lambda x: device.get_symbol_dataref() in str(x["name"]),
-                    response_json["data"],
-                ),
-            )
-        )
+    def __init__(self, patterns: list[str], cache_file: str | None = DATAREF_INDEX_FILE):
+        self.patterns = tuple(patterns)
+        self.cache_file = cache_file
+        self.names: list[str] = []
+        self.ids: list[int] = []
+        self._loading: asyncio.Task | None = None
+
+    async def lookup(self, pattern: str) -> dict[int, str]:
+        """
+        Ids and names of the datarefs containing pattern. The first call loads the index, later ones wait for it.
+        """
+        if self._loading is None:
+            self._loading = asyncio.create_task(asyncio.to_thread(self._load))
+        loading = self._loading
+        try:
+            await loading
+        except Exception:
+            if self._loading is loading:
+                self._loading = None  # the next device retries
+            raise
+
+        return {dataref_id: name for dataref_id, name in zip(self.ids, self.names) if pattern in name}
+
+    def _load(self):
+        key = self._cache_key() if self.cache_file else None
+        cache = self._read_cache()
+
+        entries = None
+        if key is not None and key in cache:
+            entries = self._fetch_named(cache[key])
+            if entries is None:
+                logging.info("Cached dataref names for %s are out of date", key)
+
+        if entries is None:
+            logging.info("Fetching the dataref list from X-Plane")
+            entries = [entry for entry in self._fetch(BASE_REST_URL) if any(pattern in entry[1] for pattern in self.patterns)]
+            if key is not None:
+                # entries for older builds of this aircraft are never read again
+                aircraft = self._aircraft_of(key)
+                cache = {old: names for old, names in cache.items() if self._aircraft_of(old) != aircraft}
+                cache[key] = sorted(name for _, name in entries)
+                self._write_cache(cache)
+
+        entries.sort(key=lambda entry: entry[1])
+        self.ids = [dataref_id for dataref_id, _ in entries]
+        self.names = [name for _, name in entries]
+        logging.info("Indexed %s CDU datarefs", len(entries))
+
+    @staticmethod
+    def _fetch(url: str) -> list[tuple[int, str]]:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            response_json = json.load(response)
+
+            return [
+                (int(dataref["id"]), str(dataref["name"]).strip())
+                for dataref in response_json["data"]
+            ]
+
+    def _fetch_named(self, names: list[str]) -> list[tuple[int, str]] | None:
+        try:
+            entries = [entry for query in self._name_queries(names) for entry in self._fetch(f"{BASE_REST_URL}?{query}")]
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning("Fetching the cached dataref names failed: %s", e)
+            return None
+
+        return entries if sorted(name for _, name in entries) == names else None
+
+    @staticmethod
+    def _name_queries(names: list[str]):
+        # the names split over as few query strings of at most DATAREF_QUERY_MAX_LENGTH characters as possible
+        parts = []
+        length = 0
+        for name in names:
+            part = urllib.parse.urlencode({"filter[name]": name})
+            if parts and length + 1 + len(part) > DATAREF_QUERY_MAX_LENGTH:
+                yield "&".join(parts)
+                parts = []
+                length = 0
+            parts.append(part)
+            length += len(part) + (1 if length else 0)
+        if parts:
+            yield "&".join(parts)
+
+    def _cache_key(self) -> str | None:
+        # X-Plane version, path of the loaded aircraft and number of datarefs: an aircraft or plugin update
+        # that adds datarefs changes the count, and the full list is fetched again.
+        # The three lookups run side by side, so they cost two round trips instead of four
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            lookups = [executor.submit(lookup) for lookup in (self._fetch_version, self._fetch_count, self._fetch_aircraft)]
+            try:
+                version, count, aircraft = [lookup.result() for lookup in lookups]
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logging.warning("Not using the dataref index cache: %s", e)
+                return None
+
+        return f"{version}|{aircraft}|{count}"
+
+    @staticmethod
+    def _aircraft_of(key: str) -> str:
+        return key.split("|", 1)[-1].rsplit("|", 1)[0]
+
+    @staticmethod
+    def _fetch_version() -> str:
+        with urllib.request.urlopen(CAPABILITIES_URL, timeout=5) as response:
+            return json.load(response)["x-plane"]["version"]
+
+    @staticmethod
+    def _fetch_count() -> int:
+        with urllib.request.urlopen(f"{BASE_REST_URL}/count", timeout=5) as response:
+            return int(json.load(response)["data"])
+
+    def _fetch_aircraft(self) -> str:
+        query = urllib.parse.urlencode({"filter[name]": AIRCRAFT_PATH_DATAREF})
+        ((aircraft_id, _),) = self._fetch(f"{BASE_REST_URL}?{query}")
+        with urllib.request.urlopen(f"{BASE_REST_URL}/{aircraft_id}/value", timeout=5) as response:
+            aircraft = base64.b64decode(json.load(response)["data"]).decode(errors="replace")
+        return aircraft.replace(chr(0), "").strip()
+
+    def _read_cache(self) -> dict[str, list[str]]:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as file:
+                return dict(json.load(file))
+        except (OSError, ValueError, TypeError) as e:
+            logging.warning("Ignoring dataref index cache %s: %s", self.cache_file, e)
+            return {}
+
+    def _write_cache(self, cache: dict[str, list[str]]):
+        if not self.cache_file:
+            return
+        temporary = self.cache_file + ".tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(cache, file)
+            os.replace(temporary, self.cache_file)
+        except OSError as e:
+            logging.warning("Could not write dataref index cache %s: %s", self.cache_file, e)
 
 
 def generate_display_json(device: CduDevice, values: dict[str, str]):
@@ -177,10 +323,10 @@ async def handle_device_update(queue: asyncio.Queue, device: CduDevice):
                 break
 
 
-async def handle_dataref_updates(queue: asyncio.Queue, device: CduDevice):
+async def handle_dataref_updates(queue: asyncio.Queue, device: CduDevice, dataref_index: DatarefIndex):
     last_known_values = {}
 
-    dataref_map = fetch_dataref_mapping(device)
+    dataref_map = await dataref_index.lookup(device.get_symbol_dataref())
     logging.info("Connecting to X-Plane websocket server")
     async for websocket in websockets.connect(BASE_WEBSOCKET_URI):
         logging.info("Connected successfully to X-Plane websocket server")
@@ -271,13 +417,17 @@ async def get_available_devices() -> list[CduDevice]:
 
 async def main():
     available_devices = await get_available_devices()
+    # one dataref list download for all devices, covering every device of the aircraft for the cache
+    dataref_index = DatarefIndex([device.get_symbol_dataref() for device in CduDevice])
 
     tasks = []
 
     for device in available_devices:
         queue = asyncio.Queue()
 
-        tasks.append(asyncio.create_task(handle_dataref_updates(queue, device)))
+        tasks.append(
+            asyncio.create_task(handle_dataref_updates(queue, device, dataref_index))
+        )
         tasks.append(asyncio.create_task(handle_device_update(queue, device)))
 
     logging.info("Started background tasks for %s", available_devices)
@@ -4,16 +4,47 @@ import json
 import logging
 import asyncio
 import struct
+import threading
+from time import perf_counter
 import websockets.asyncio.client as ws_client
 from typing import Optional, List, Dict, Union, Any
+try:
+    import numpy as np  # optional, enables create_mobi_json_numpy()
+except ImportError:
+    np = None
 from SimConnect import SimConnect, Enum
 from SimConnect.Enum import SIMCONNECT_CLIENT_DATA_ID, SIMCONNECT_RECV_ID, SIMCONNECT_RECV_CLIENT_DATA
 
 
+class ClientDataHandlerStats:
+    """Call count and time spent in one client data handler."""
+    __slots__ = ("name", "define_ids", "calls", "seconds", "max_seconds")
+
+    def __init__(self, handler):
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.define_ids = []
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def __str__(self):
+        average = self.seconds / self.calls * 1e6 if self.calls else 0.0
+        routes = self.define_ids or "all"
+        return f"{self.name} (define ids {routes}): {self.calls} calls, avg {average:.1f} us, max {self.max_seconds * 1e6:.1f} us"
+
+
 class SimConnectMobiFlight(SimConnect):
 
     def __init__(self, auto_connect=True, library_path=None):
-        self.client_data_handlers = []
+        self.client_data_handlers = []  # catch-all, for packets whose define id has no route
+        self.client_data_routes = {}    # dwDefineID -> [handler, ...]
+        self.client_data_stats = {}     # handler -> ClientDataHandlerStats
         if library_path:
             super().__init__(auto_connect, library_path)
         else:
@@ -22,26 +53,64 @@ class SimConnectMobiFlight(SimConnect):
         self.dll.MapClientDataNameToID.argtypes = [wintypes.HANDLE, ctypes.c_char_p, SIMCONNECT_CLIENT_DATA_ID]
 
 
-    def register_client_data_handler(self, handler):
-        if not handler in self.client_data_handlers:
+    def register_client_data_handler(self, handler, define_id=None):
+        # with a define_id the handler only gets packets of that definition (one dict lookup per
+        # packet); without one it is a catch-all for packets no routed handler is registered for
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.setdefault(define_id, [])
+        if handler not in handlers:
             logging.info("Register new client data handler")
-            self.client_data_handlers.append(handler)
+            handlers.append(handler)
+            stats = self.client_data_stats.setdefault(handler, ClientDataHandlerStats(handler))
+            if define_id is not None:
+                stats.define_ids.append(define_id)
 
 
-    def unregister_client_data_handler(self, handler):
-        if handler in self.client_data_handlers:
+    def unregister_client_data_handler(self, handler, define_id=None):
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.get(define_id, [])
+        if handler in handlers:
             logging.info("Unregister client data handler")
-            self.client_data_handlers.remove(handler)
+            handlers.remove(handler)
+            if define_id is not None and not handlers:
+                del self.client_data_routes[define_id]
+
+
+    def log_client_data_stats(self):
+        for stats in self.client_data_stats.values():
+            logging.info("Client data handler %s", stats)
 
 
     def my_dispatch_proc(self, pData, cbData, pContext):
         dwID = pData.contents.dwID
         if dwID == SIMCONNECT_RECV_ID.SIMCONNECT_RECV_ID_CLIENT_DATA:
             client_data = ctypes.cast(pData, ctypes.POINTER(SIMCONNECT_RECV_CLIENT_DATA)).contents
-            for handler in self.client_data_handlers:
-                handler(client_data)
+            self.dispatch_client_data(client_data)
         else:
             super().my_dispatch_proc(pData, cbData, pContext)
+
+
+    def dispatch_client_data(self, client_data):
+        handlers = self.client_data_routes.get(client_data.dwDefineID, self.client_data_handlers)
+        for handler in handlers:
+            start = perf_counter()
+            handler(client_data)
+            self.client_data_stats[handler].record(perf_counter() - start)
+
+
+# Size of the SIMCONNECT_RECV_CLIENT_DATA header in front of dwData
+CLIENT_DATA_HEADER_SIZE: int = SIMCONNECT_RECV_CLIENT_DATA.dwData.offset
+DWORD_SIZE: int = ctypes.sizeof(wintypes.DWORD)
+
+
+def client_data_bytes(client_data: Any, size: int) -> bytes:
+    """Up to `size` bytes of a client data packet's payload, copied out of dwData in one go."""
+    size = max(0, min(size, client_data.dwSize - CLIENT_DATA_HEADER_SIZE))
+    if DWORD_SIZE == 4:
+        return ctypes.string_at(ctypes.addressof(client_data.dwData), size)
+    # DWORD is 8 bytes wide off Windows (e.g. under Tools/fake_simconnect.py): one value per element
+    words = -(-size // 4)
+    return struct.pack(f"{words}I", *client_data.dwData[:words])[:size]
+
+
 # URLs
 CAPTAIN_CDU_URL: str = "ws://localhost:8320/winwing/cdu-captain"
 CO_PILOT_CDU_URL: str = "ws://localhost:8320/winwing/cdu-co-pilot"
@@ -122,9 +191,12 @@ class MobiFlightClient:
         logging.info("Max retries reached. Giving up connecting to MobiFlight at %s", self.websocket_uri)
         self.connected.set()
 
-    async def send(self, data: str) -> None:
+    async def send(self, data: str) -> bool:
+        # False when the frame was dropped because MobiFlight is not connected
         if self.websocket and self.connected.is_set():
             await self.websocket.send(data)
+            return True
+        return False
 
     async def close(self) -> None:
         if self.websocket:
@@ -193,6 +265,117 @@ def create_mobi_json(data: bytes) -> str:
     
     return json.dumps(message)
 
+# NumPy backend (pip install numpy): screen and attribute planes mapped through lookup arrays to
+# indices into CDU_CELL_JSON_*, the JSON of every symbol x style combination per CDU type
+if np is not None:
+    CDU_COLOR_CODES: Dict[int, str] = {
+        CDU_COLOR_WHITE: "w",
+        CDU_COLOR_AMBER: "a",
+        CDU_COLOR_CYAN: "c",
+        CDU_COLOR_GREEN: "g",
+        CDU_COLOR_MAGENTA: "m",
+        CDU_COLOR_RED: "r",
+    }
+    CDU_STYLES: List[str] = [f', "{color_str}", {small}]' for color_str in "wacgmr" for small in (0, 1)]
+
+    def _symbol_json(code: int, cdutype: int) -> Optional[str]:
+        symbol: str = chr(code)
+        if symbol == ' ' or symbol == '\0':
+            return None
+        if symbol == '{': symbol = "["
+        elif symbol == '}': symbol = "]"
+        elif symbol == '[': symbol = "\u2610"                   # box
+        elif cdutype == CDU_TYPE_HW and symbol == '$': symbol = "\u00B0"  # degrees
+        elif cdutype == CDU_TYPE_HW and symbol == '!': symbol = "\u2193"  # down arrow
+        return "[" + json.dumps(symbol)
+
+    def _style_index(atrb: int, cdutype: int) -> int:
+        # Honeywell CDUs are always green
+        color_str: str = "g" if cdutype == CDU_TYPE_HW else CDU_COLOR_CODES.get(atrb & CDU_COLOR_MASK, "w")
+        return CDU_STYLES.index(f', "{color_str}", {1 if atrb & CDU_FLAG_SMALL_FONT else 0}]')
+
+    def _cell_json(cdutype: int):
+        return np.array(["[]" if symbol is None else symbol + style
+                         for symbol in (_symbol_json(code, cdutype) for code in range(256)) for style in CDU_STYLES], dtype=object)
+
+    CDU_CELL_JSON_HW = _cell_json(CDU_TYPE_HW)
+    CDU_CELL_JSON_CM = _cell_json(CDU_TYPE_CM)
+    CDU_STYLE_INDEX_HW = np.array([_style_index(atrb, CDU_TYPE_HW) for atrb in range(256)], dtype=np.intp)
+    CDU_STYLE_INDEX_CM = np.array([_style_index(atrb, CDU_TYPE_CM) for atrb in range(256)], dtype=np.intp)
+else:
+    CDU_STYLES = CDU_CELL_JSON_HW = CDU_CELL_JSON_CM = CDU_STYLE_INDEX_HW = CDU_STYLE_INDEX_CM = None  # create_mobi_json_numpy() is only used with NumPy
+
+
+def create_mobi_json_numpy(data: bytes) -> str:
+    # same output as create_mobi_json(), which also handles short buffers
+    if len(data) < CDU_SC_DATA_SIZE:
+        return create_mobi_json(data)
+    # every type other than Honeywell is decoded like the Canadian one
+    if data[CDU_TYPE_OFFSET] == CDU_TYPE_HW:
+        cell_json, style_index = CDU_CELL_JSON_HW, CDU_STYLE_INDEX_HW
+    else:
+        cell_json, style_index = CDU_CELL_JSON_CM, CDU_STYLE_INDEX_CM
+    symbols = np.frombuffer(data, np.uint8, CDU_CELLS, CDU_DATA_OFFSET).astype(np.intp)
+    styles = style_index[np.frombuffer(data, np.uint8, CDU_CELLS, CDU_ATRB_OFFSET)]
+    return '{"Target": "Display", "Data": [' + ", ".join(cell_json[symbols * len(CDU_STYLES) + styles].tolist()) + "]}"
+
+# Encoder used by the CDU client: the NumPy backend when NumPy is installed
+mobi_json_encoder = create_mobi_json_numpy if np is not None else create_mobi_json
+
+class FrameMailbox:
+    """Latest-wins, single-slot hand-over of CDU frames from the SimConnect thread to the event loop.
+
+    post() overwrites a frame the sender has not taken yet, so a WebSocket slower than the sim makes
+    the display skip frames instead of queueing them and falling further and further behind.
+    """
+    def __init__(self) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._frame: Optional[bytes] = None
+        self._pending_since: float = 0.0
+        self._ready: asyncio.Event = asyncio.Event()
+        self.posted: int = 0
+        self.coalesced: int = 0      # frames overwritten before the sender took them
+        self.taken: int = 0
+        self.total_age: float = 0.0  # seconds the slot was pending when taken, summed
+        self.max_age: float = 0.0
+
+    def post(self, frame: bytes) -> None:
+        # SimConnect thread: one lock and, only when the slot was empty, one wake-up of the sender
+        with self._lock:
+            wake: bool = self._frame is None
+            if wake:
+                self._pending_since = perf_counter()
+            else:
+                self.coalesced += 1
+            self._frame = frame
+            self.posted += 1
+        if wake and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def get(self) -> bytes:
+        while True:
+            with self._lock:
+                frame, self._frame = self._frame, None
+                if frame is not None:
+                    age: float = perf_counter() - self._pending_since
+                    self.taken += 1
+                    self.total_age += age
+                    self.max_age = max(self.max_age, age)
+                    return frame
+                self._ready.clear()
+            await self._ready.wait()
+
+    def age(self) -> float:
+        """Seconds the oldest frame not yet sent has been waiting, 0 when the slot is empty."""
+        with self._lock:
+            return perf_counter() - self._pending_since if self._frame is not None else 0.0
+
+    def __str__(self) -> str:
+        average = self.total_age / self.taken * 1e3 if self.taken else 0.0
+        return (f"{self.posted} frames posted, {self.coalesced} coalesced, {self.taken} sent, "
+                f"queue age avg {average:.2f} ms, max {self.max_age * 1e3:.2f} ms")
+
 class MDXCDUClient:
     def __init__(self, sc_mobiflight: SimConnectMobiFlight, websocket_uri: str, cdu_name: str, cdu_id: int, cdu_definition: int) -> None:
         self.sc_mobiflight: SimConnectMobiFlight = sc_mobiflight
@@ -201,6 +384,10 @@ class MDXCDUClient:
         self.cdu_definition: int = cdu_definition
         self.cdu_name: str = cdu_name
         self.cdu_id: int = cdu_id
+        self.last_data: Optional[bytes] = None
+        self.unique_frames: int = 0       # frames that differed from the previous one
+        self.duplicate_frames: int = 0    # frames identical to the previous one, skipped
+        self.mailbox: FrameMailbox = FrameMailbox()
 
     def failed_to_connect(self) -> bool:
         return self.mobiflight.retries >= self.mobiflight.max_retries
@@ -235,29 +422,49 @@ class MDXCDUClient:
             )
 
             # Set up the handler
-            self.sc_mobiflight.register_client_data_handler(self.handle_cdu_data)
+            self.sc_mobiflight.register_client_data_handler(self.handle_cdu_data, self.cdu_definition)
             logging.info("SimConnect initialized for %s", self.cdu_name)
             return True
         except Exception as e:
             logging.error(f"SimConnect setup failed for {self.cdu_name}: {e}")
             return False
         
+    def log_frame_stats(self) -> None:
+        logging.info("%s: %d unique CDU frames, %d duplicate frames skipped",
+                     self.cdu_name, self.unique_frames, self.duplicate_frames)
+        logging.info("%s: %s", self.cdu_name, self.mailbox)
+
     def handle_cdu_data(self, client_data: Any) -> None:
         try:
             if client_data.dwDefineID == self.cdu_definition and hasattr(client_data, 'dwData'):                
-                int_count : int = int(CDU_SC_DATA_SIZE/ 4)              
-                if len(client_data.dwData) >= int_count:
-                    data_list : bytearray = bytearray()                  
-                    for i in range(int_count): 
-                        my_bytes : bytes = struct.pack("I", client_data.dwData[i])
-                        data_list.extend(my_bytes)                
-                    data: bytes = bytes(data_list)                                       
-                    asyncio.run_coroutine_threadsafe(self.mobiflight.send(create_mobi_json(data)), self.event_loop)
+                data: bytes = client_data_bytes(client_data, CDU_SC_DATA_SIZE)
+                if len(data) == CDU_SC_DATA_SIZE:
+                    # Only decode and send if data has changed; a re-broadcast frame costs one bytes compare
+                    if data == self.last_data:
+                        self.duplicate_frames += 1
+                        return
+                    self.last_data = data
+                    self.unique_frames += 1
+                    self.mailbox.post(data)
         except Exception as e:
             logging.error(f"Error handling CDU data: {e}")
 
+    async def send_frames(self) -> None:
+        # Decodes and sends only the newest frame handle_cdu_data posted to the mailbox
+        while True:
+            data: bytes = await self.mailbox.get()
+            try:
+                sent: bool = await self.mobiflight.send(mobi_json_encoder(data))
+            except Exception as e:
+                logging.error(f"Error sending CDU data: {e}")
+                sent = False
+            if not sent:
+                # the display never got this frame: let the next re-broadcast of it through
+                self.last_data = None
+
     async def run(self) -> None:
         self.event_loop = asyncio.get_running_loop()
+        self.mailbox.loop = self.event_loop
         logging.info("Starting CDU client")
         
         try:
@@ -269,7 +476,9 @@ class MDXCDUClient:
                 return
             # Initialize SimConnect
             if self.setup_simconnect():
+                sender_task: asyncio.Task = asyncio.create_task(self.send_frames())
                 await asyncio.gather(mobiflight_task)
+                sender_task.cancel()
             else:
                 logging.error("Failed to start - SimConnect initialization failed")
         except KeyboardInterrupt:
@@ -302,4 +511,7 @@ if __name__ == "__main__":
     except Exception as e:
         logging.error(f"Error: {e}")
     finally:
+        sc_mobiflight.log_client_data_stats()
+        captain_client.log_frame_stats()
+        co_pilot_client.log_frame_stats()
         sc_mobiflight.exit()
@@ -1,16 +1,32 @@
 # H135_all_in_one
 # Single-file bridge: SimConnect(MobiFlight LVARs) -> WinWing MCDU (captain)
-# Requires: pip install websocket-client SimConnect==0.4.24 (or your working SimConnect lib)
+# Requires: pip install websockets SimConnect==0.4.24 (or your working SimConnect lib)
 # CREDITS: Koseng on GitHub and his MSFSPythonSimConnectMobiFlightExtension (https://github.com/Koseng/MSFSPythonSimConnectMobiFlightExtension)
 
+import argparse
+import asyncio
+import concurrent.futures
+from array import array
+import gzip
+import heapq
 import json
+import os
+import queue
+import random
+import re
 import logging, logging.handlers
 import ctypes
+import sys
+import threading
 from ctypes import wintypes
-from time import sleep, time
-from typing import List, Tuple, Union, Optional
+from time import perf_counter, sleep, time
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Tuple, Union, Optional
+from functools import lru_cache
+from collections import deque
 from itertools import chain
-from websocket import create_connection, WebSocket, WebSocketException
+import websockets
+import websockets.asyncio.client as ws_client
+import websockets.asyncio.server as ws_server
 
 # ========================= SimConnectMobiFlight =========================
 from SimConnect import SimConnect
@@ -19,12 +35,38 @@ from SimConnect.Enum import (
     SIMCONNECT_RECV_ID,
     SIMCONNECT_RECV_CLIENT_DATA,
     SIMCONNECT_CLIENT_DATA_PERIOD,
+    SIMCONNECT_CLIENTDATATYPE_FLOAT32,
     SIMCONNECT_UNUSED,
 )
 
+class ClientDataHandlerStats:
+    """Call count and time spent in one client data handler."""
+    __slots__ = ("name", "define_ids", "calls", "seconds", "max_seconds")
+
+    def __init__(self, handler):
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.define_ids = []
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def __str__(self):
+        average = self.seconds / self.calls * 1e6 if self.calls else 0.0
+        routes = self.define_ids or "all"
+        return f"{self.name} (define ids {routes}): {self.calls} calls, avg {average:.1f} us, max {self.max_seconds * 1e6:.1f} us"
+
 class SimConnectMobiFlight(SimConnect):
     def __init__(self, auto_connect=True, library_path=None):
-        self.client_data_handlers = []
+        self.client_data_handlers = []  # catch-all, for packets whose define id has no route
+        self.client_data_routes = {}    # dwDefineID -> [handler, ...]
+        self.client_data_stats = {}     # handler -> ClientDataHandlerStats
+        self.dispatch_complete_handlers = []
         if library_path:
             super().__init__(auto_connect, library_path)
         else:
@@ -32,41 +74,554 @@ class SimConnectMobiFlight(SimConnect):
         # Fix missing types
         self.dll.MapClientDataNameToID.argtypes = [wintypes.HANDLE, ctypes.c_char_p, SIMCONNECT_CLIENT_DATA_ID]
 
-    def register_client_data_handler(self, handler):
-        if handler not in self.client_data_handlers:
+    def register_client_data_handler(self, handler, define_id=None):
+        # with a define_id the handler only gets packets of that definition (one dict lookup per
+        # packet); without one it is a catch-all for packets no routed handler is registered for
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.setdefault(define_id, [])
+        if handler not in handlers:
             logging.info("Register new client data handler")
-            self.client_data_handlers.append(handler)
+            handlers.append(handler)
+            stats = self.client_data_stats.setdefault(handler, ClientDataHandlerStats(handler))
+            if define_id is not None:
+                stats.define_ids.append(define_id)
 
-    def unregister_client_data_handler(self, handler):
-        if handler in self.client_data_handlers:
+    def unregister_client_data_handler(self, handler, define_id=None):
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.get(define_id, [])
+        if handler in handlers:
             logging.info("Unregister client data handler")
-            self.client_data_handlers.remove(handler)
+            handlers.remove(handler)
+            if define_id is not None and not handlers:
+                del self.client_data_routes[define_id]
+
+    def log_client_data_stats(self):
+        for stats in self.client_data_stats.values():
+            logging.info("Client data handler %s", stats)
+
+    def register_dispatch_complete_handler(self, handler):
+        if handler not in self.dispatch_complete_handlers:
+            self.dispatch_complete_handlers.append(handler)
+
+    def unregister_dispatch_complete_handler(self, handler):
+        if handler in self.dispatch_complete_handlers:
+            self.dispatch_complete_handlers.remove(handler)
+
+    def _run(self):
+        # Message pump thread (started by SimConnect.connect): drain all queued messages,
+        # then let handlers publish whatever that batch changed in one step
+        while self.quit == 0:
+            try:
+                self.dll.CallDispatch(self.hSimConnect, self.my_dispatch_proc_rd, None)
+                for handler in self.dispatch_complete_handlers:
+                    handler()
+                sleep(.002)
+            except OSError as err:
+                logging.error("SimConnect dispatch error: %s", err)
 
     def my_dispatch_proc(self, pData, cbData, pContext):
         dwID = pData.contents.dwID
         if dwID == SIMCONNECT_RECV_ID.SIMCONNECT_RECV_ID_CLIENT_DATA:
             client_data = ctypes.cast(pData, ctypes.POINTER(SIMCONNECT_RECV_CLIENT_DATA)).contents
-            for handler in self.client_data_handlers:
-                handler(client_data)
+            self.dispatch_client_data(client_data)
         else:
             super().my_dispatch_proc(pData, cbData, pContext)
 
+    def dispatch_client_data(self, client_data):
+        handlers = self.client_data_routes.get(client_data.dwDefineID, self.client_data_handlers)
+        for handler in handlers:
+            start = perf_counter()
+            handler(client_data)
+            self.client_data_stats[handler].record(perf_counter() - start)
+
 # ========================= MobiFlightVariableRequests =========================
 import struct
 from ctypes import sizeof
 from ctypes.wintypes import FLOAT
 
+# Size of the SIMCONNECT_RECV_CLIENT_DATA header in front of dwData
+CLIENT_DATA_HEADER_SIZE = SIMCONNECT_RECV_CLIENT_DATA.dwData.offset
+DWORD_SIZE = sizeof(wintypes.DWORD)
+
+def client_data_bytes(client_data, size: int) -> bytes:
+    """Up to `size` bytes of a client data packet's payload, copied out of dwData in one go."""
+    size = max(0, min(size, client_data.dwSize - CLIENT_DATA_HEADER_SIZE))
+    if DWORD_SIZE == 4:
+        return ctypes.string_at(ctypes.addressof(client_data.dwData), size)
+    # DWORD is 8 bytes wide off Windows (e.g. under Tools/fake_simconnect.py): one value per element
+    words = -(-size // 4)
+    return struct.pack(f"{words}I", *client_data.dwData[:words])[:size]
+
+class LVarFilter(NamedTuple):
+    """When a new value of a variable counts as a change.
+
+    epsilon: the value has to move by more than this from the last delivered value. SimConnect
+             applies it to the variable's FLOAT32 datum; _apply_value() checks it again because a
+             block delivery carries every slot of the block.
+    step:    quantisation step, values are rounded to a multiple of it (0 = off)
+    boolean: reduce the value to its as01() level (0, 1 or 2), all the CAS page reads of it
+    Quantisation and boolean mode only exist client side, SimConnect has no equivalent.
+    """
+    epsilon: float = 0.0
+    step: float = 0.0
+    boolean: bool = False
+
+    def apply(self, value: float) -> float:
+        if self.boolean:
+            return float(as01(value))
+        if self.step:
+            return round(value / self.step) * self.step
+        return value
+
 class SimVariable:
-    def __init__(self, id, name, float_value=None):
+    def __init__(self, id, name, float_value=None, default=None, filter=None):
         self.id = id
         self.name = name
         self.float_value = float_value
+        self.default = default
+        self.filter: Optional[LVarFilter] = filter
         self.initialized = False
+        self.confirmed = False  # the WASM module acknowledged its MF.SimVars.Add
     def __str__(self):
         return f"Id={self.id}, value={self.float_value}, name={self.name}"
 
+# LVAR slots span several MobiFlight client channels ("MobiFlight" plus clients opened with
+# MF.Clients.Add), each with its own <client>.LVars area of LVAR_AREA_SIZE bytes. Variable ids
+# are global slot numbers: id = area index * LVAR_SLOTS_PER_AREA + slot + 1.
+LVAR_AREA_SIZE = 4096
+LVAR_SLOTS_PER_AREA = LVAR_AREA_SIZE // sizeof(FLOAT)
+MAX_LVAR_AREAS = 8                  # client channels this bridge opens at most (8192 variables)
+LVAR_CLIENT_PREFIX = "EC135Bridge"  # name of the additional client channels, followed by the area index
+LVAR_PLACEHOLDER = "0"              # RPN constant re-added for freed slots when an area is rebuilt
+CLIENT_ADD_TIMEOUT = 2.0            # seconds to wait for MF.Clients.Add.<name>.Finished
+RESPONSE_DEFINITION_BASE = 0x10000  # definition/request ids of the response strings of areas 1..n
+BLOCK_DEFINITION_BASE = 0x20000     # definition/request ids of the per-area LVAR blocks
+# One definition and request per area covering all its slots, decoded in one callback; False =
+# one definition, request and callback per variable
+BLOCK_SUBSCRIPTION = True
+# Slot lists saved once the WASM module confirmed them, so a restarted bridge can reattach to the
+# subscriptions the WASM module still evaluates instead of clearing and re-adding them; None = off,
+# e.g. os.path.join(os.path.dirname(os.path.abspath(__file__)), "microsoft_aircraft_ec135.lvars.json").
+# Slot 0 of every area then holds a numeric token (an RPN constant) that identifies the saved lists.
+LVAR_REGISTRY_FILE = None
+REGISTRY_DEFINITION_BASE = 0x30000  # definition/request ids of the one-off token reads
+REATTACH_REQUEST_BASE = 0x40000     # request ids of the first reads of reattached variables (per-variable mode)
+REGISTRY_VERIFY_TIMEOUT = 0.5       # seconds to wait for the tokens before starting cold
+
+class LVarArea:
+    """One MobiFlight client channel: its client data area ids and which slot holds which variable."""
+    def __init__(self, index: int, client_name: str):
+        self.index = index
+        self.client_name = client_name
+        self.lvars_id = index * 3
+        self.command_id = index * 3 + 1
+        self.response_id = index * 3 + 2
+        self.response_definition_id = 0 if index == 0 else RESPONSE_DEFINITION_BASE + index
+        self.lvars_mapped = False  # <client>.LVars already mapped to lvars_id (SimConnect has no unmap)
+        # slot -> variable name in the order the WASM module knows them, None for a freed slot
+        self.slots: List[Optional[str]] = []
+        self.free: List[int] = []  # heap of freed slots, reused lowest first
+        self.defined = {}          # slot -> epsilon of the client data definition already added
+        self.pending_adds: List[str] = []  # MF.SimVars.Add not sent yet, flushed by _update_areas()
+        self.needs_rebuild = False
+        self.ready = threading.Event()
+        # block mode: one definition over slots [0, block_size) and the bytes last received for it;
+        # block_stale = new or reused slots that need a fresh request to get their first value
+        self.block_definition_id = BLOCK_DEFINITION_BASE + index
+        self.block_size = 0
+        self.block_bytes = b""
+        self.block_stale = False
+
+    def id_of(self, slot: int) -> int:
+        return self.index * LVAR_SLOTS_PER_AREA + slot + 1
+
+    @property
+    def used(self) -> int:
+        return len(self.slots) - len(self.free)
+
+# Commands share one 256-byte Command area per channel, so they are written one at a time and each
+# one is acknowledged through the channel's Response area before the next is written. The WASM
+# module reads the area once per frame: a command written over one it has not read yet is lost.
+COMMAND_ACK_TIMEOUT = 0.5         # seconds to wait for an acknowledgement before moving on
+COMMAND_LATENCY_SAMPLES = 1000    # round trips kept for the latency percentiles
+COMMAND_FENCE = "MF.Ping"         # written a frame after commands the WASM module does not answer itself
+COMMAND_FENCE_BATCH = 32          # commands of one area at most that share a fence
+FRAME_TICK_DEFINITION_ID = 0x50000  # definition/request id of the once-per-frame delivery pacing the fence
+# The WASM module counts as stalled once a command is unanswered for this many times the median
+# round trip (at least WASM_STALL_MIN seconds and WASM_STALL_FRAMES frames), long before
+# COMMAND_ACK_TIMEOUT expires. Nothing counts as a stall before the first round trip was measured.
+WASM_STALL_FACTOR = 5.0
+WASM_STALL_MIN = 0.05
+WASM_STALL_FRAMES = 3             # a fenced command needs two frame ticks and the Pong
+HEALTH_PROBE_INTERVAL = 1.0       # seconds without commands after which the queue sends an MF.Ping probe
+
+class CommandResult(NamedTuple):
+    command: str
+    response: str       # response that acknowledged the command (MF.Pong for fenced commands)
+    round_trip: float   # seconds from writing the command to its acknowledgement (fenced: by the shared fence)
+
+def expected_response(command: str) -> Optional[str]:
+    """Response the WASM module writes for `command`, None for commands it does not answer."""
+    if command == "MF.Ping":
+        return "MF.Pong"
+    if command.startswith("MF.Clients.Add."):
+        return command + ".Finished"
+    return None
+
+class CommandQueue:
+    """Serialises MobiFlight commands on a sender thread, pacing them by the WASM module's responses.
+
+    A command is acknowledged by its own response, or for commands without one, by the MF.Pong
+    answering a COMMAND_FENCE. Such commands are written one frame apart (see frame_tick()), so
+    the WASM module has read each one before the next command or the fence replaces it, and a
+    run of them on one area shares the fence written once the queue is empty. Each of them
+    therefore costs two frames: 56 registrations take about 2 s at 60 fps.
+
+    MF.Pong carries no id, so after an unanswered MF.Ping the queue keeps waiting for that Pong
+    for another ack_timeout before it writes anything else; a Pong arriving late is swallowed
+    instead of acknowledging the next command.
+
+    Stall detection (see health()) runs only with a probe_interval: without probes there may be
+    no WASM module to answer at all.
+    """
+    def __init__(self, write, ack_timeout: float = COMMAND_ACK_TIMEOUT,
+                 probe_interval: Optional[float] = HEALTH_PROBE_INTERVAL, on_health_change=None):
+        self._write = write  # write(command, area) puts one command into the area's Command slot
+        self.ack_timeout = ack_timeout
+        self.probe_interval = probe_interval  # None = no MF.Ping probes while idle
+        self._on_health_change = on_health_change  # on_health_change(stalled), called on the queue thread
+        self._queue = queue.Queue()
+        self._changed = threading.Condition()  # notified for every acknowledgement and frame tick
+        self.frames = 0
+        self.frame_interval = 0.0  # seconds between the last two frame ticks
+        self._last_frame_at: Optional[float] = None
+        self._expected: Optional[Tuple[Optional[LVarArea], str]] = None
+        self._response: Optional[str] = None
+        self._in_flight_since: Optional[float] = None
+        self.last_acknowledged_at: Optional[float] = None
+        self.stalled = False
+        self._idle = threading.Event()
+        self._idle.set()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.acknowledged = 0
+        self.timeouts = 0
+        self.max_depth = 0
+        self._round_trips = deque(maxlen=COMMAND_LATENCY_SAMPLES)
+        self._queue_waits = deque(maxlen=COMMAND_LATENCY_SAMPLES)
+        self._thread = threading.Thread(target=self._run, name="MobiFlightCommands", daemon=True)
+        self._thread.start()
+
+    def put(self, command: str, area: Optional[LVarArea] = None) -> concurrent.futures.Future:
+        """Queue a command. The future resolves to a CommandResult once the WASM module acknowledged
+        it, or fails with TimeoutError; asyncio code can await asyncio.wrap_future(future)."""
+        future = concurrent.futures.Future()
+        with self._lock:
+            self._pending += 1
+            self.max_depth = max(self.max_depth, self._pending)
+            self._idle.clear()
+        self._queue.put((command, area, perf_counter(), future))
+        return future
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    def acknowledge(self, area: Optional[LVarArea], response: str):
+        # called on the SimConnect thread for every response string
+        expected = self._expected
+        if expected is not None and expected[1] == response and (expected[0] is None or expected[0] is area):
+            with self._changed:
+                self._response = response
+                self._changed.notify_all()
+
+    def frame_tick(self):
+        # called on the SimConnect thread once per simulator frame
+        now = perf_counter()
+        with self._changed:
+            if self._last_frame_at is not None:
+                self.frame_interval = now - self._last_frame_at
+            self._last_frame_at = now
+            self.frames += 1
+            self._changed.notify_all()
+
+    def stall_threshold(self) -> Optional[float]:
+        """Seconds without an answer after which the WASM module counts as stalled, None while
+        stall detection is off or no round trip was measured yet."""
+        if self.probe_interval is None or not self._round_trips:
+            return None
+        round_trips = sorted(self._round_trips)
+        return max(WASM_STALL_MIN, WASM_STALL_FRAMES * self.frame_interval,
+                   WASM_STALL_FACTOR * _percentile(round_trips, 0.50))
+
+    def health(self) -> dict:
+        """Whether the WASM module answers: `stalled` is set as soon as the command in flight is
+        unanswered for stall_threshold() seconds and cleared by the next acknowledgement."""
+        now = perf_counter()
+        in_flight_since = self._in_flight_since
+        stall_threshold = self.stall_threshold()
+        return {
+            "stalled": self.stalled,
+            "in_flight_ms": (now - in_flight_since) * 1000.0 if in_flight_since is not None else 0.0,
+            "since_last_ack_ms": (now - self.last_acknowledged_at) * 1000.0 if self.last_acknowledged_at is not None else None,
+            "stall_threshold_ms": stall_threshold * 1000.0 if stall_threshold is not None else None,
+        }
+
+    def wait_until_idle(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued command was written and acknowledged (or timed out)."""
+        return self._idle.wait(timeout)
+
+    def close(self):
+        self._queue.put((None, None, 0.0, None))
+        self._thread.join(timeout=self.ack_timeout * 2)
+
+    def stats(self) -> dict:
+        round_trips = sorted(self._round_trips)
+        return {
+            "depth": self._pending,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "acknowledged": self.acknowledged,
+            "timeouts": self.timeouts,
+            "rtt_ms_p50": _percentile(round_trips, 0.50) * 1000.0,
+            "rtt_ms_p99": _percentile(round_trips, 0.99) * 1000.0,
+            "rtt_ms_max": (round_trips[-1] if round_trips else 0.0) * 1000.0,
+            "queue_ms_avg": (sum(self._queue_waits) / len(self._queue_waits) * 1000.0) if self._queue_waits else 0.0,
+        }
+
+    def _run(self):
+        batch = []  # commands written to batch_area but not fenced yet: (command, queued_at, sent_at, future)
+        batch_area = None
+        while True:
+            if batch and self._queue.empty():
+                self._fence(batch_area, batch)
+                batch = []
+            try:
+                command, area, queued_at, future = self._queue.get(timeout=self.probe_interval)
+            except queue.Empty:
+                # idle: probe, so a stalled WASM module is noticed without other traffic
+                self.put("MF.Ping")
+                continue
+            response = expected_response(command) if command is not None else None
+            # the WASM module handles each channel's commands in order, so a fence only covers
+            # the commands written to its own area
+            if batch and (command is None or response is not None or area is not batch_area
+                          or len(batch) >= COMMAND_FENCE_BATCH):
+                self._fence(batch_area, batch)
+                batch = []
+            if command is None:
+                return
+            self._response = None
+            sent_at = self._in_flight_since = perf_counter()
+            try:
+                if response is None:
+                    # the next command or the fence may only replace this one a frame later; the
+                    # first tick may already have been on its way, so a whole frame lies before the second
+                    self._write(command, area)
+                    frame = self.frames
+                    if self._wait(command, sent_at, lambda: self.frames >= frame + 2):
+                        batch.append((command, queued_at, sent_at, future))
+                        batch_area = area
+                        continue
+                    self._finish(command, queued_at, sent_at, future, None)
+                    continue
+                self._expected = (area, response)
+                self._write(command, area)
+                acknowledged = self._wait(command, sent_at, lambda: self._response is not None)
+            except OSError as err:
+                logging.error("Writing command %s failed: %s", command, err)
+                acknowledged = False
+            if acknowledged:
+                self._round_trips.append(perf_counter() - sent_at)
+            self._finish(command, queued_at, sent_at, future, self._response if acknowledged else None)
+            if not acknowledged and response == "MF.Pong":
+                self._swallow_late_pong(area)
+
+    def _fence(self, area: Optional[LVarArea], batch: list):
+        # one MF.Ping answers for every command written to the area before it
+        command = batch[-1][0]
+        self._response = None
+        fence_at = self._in_flight_since = perf_counter()
+        self._expected = (area, "MF.Pong")
+        try:
+            self._write(COMMAND_FENCE, area)
+            acknowledged = self._wait(command, fence_at, lambda: self._response is not None)
+        except OSError as err:
+            logging.error("Writing command %s failed: %s", COMMAND_FENCE, err)
+            acknowledged = False
+        if acknowledged:
+            # from the last command of the batch, so the stall threshold does not grow with the batch
+            self._round_trips.append(perf_counter() - batch[-1][2])
+        for command, queued_at, sent_at, future in batch:
+            self._finish(command, queued_at, sent_at, future, self._response if acknowledged else None)
+        if not acknowledged:
+            self._swallow_late_pong(area)
+
+    def _swallow_late_pong(self, area: Optional[LVarArea]):
+        self._response = None
+        self._expected = (area, "MF.Pong")
+        with self._changed:
+            if self._changed.wait_for(lambda: self._response is not None, self.ack_timeout):
+                logging.debug("Late MF.Pong swallowed")
+        self._expected = None
+
+    def _finish(self, command: str, queued_at: float, sent_at: float, future: concurrent.futures.Future,
+                response: Optional[str]):
+        acknowledged_at = perf_counter()
+        self._expected = None
+        self._in_flight_since = None
+        self.sent += 1
+        self._queue_waits.append(sent_at - queued_at)
+        if response is not None:
+            self.acknowledged += 1
+            self.last_acknowledged_at = acknowledged_at
+            if self.stalled:
+                logging.info("MobiFlight WASM module answers again")
+                self._set_stalled(False)
+            future.set_result(CommandResult(command, response, acknowledged_at - sent_at))
+        else:
+            self.timeouts += 1
+            logging.debug("No acknowledgement for %s within %s s", command, self.ack_timeout)
+            future.set_exception(TimeoutError(f"No acknowledgement for {command} within {self.ack_timeout} s"))
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.set()
+
+    def _wait(self, command: str, sent_at: float, predicate) -> bool:
+        # first wait up to the stall threshold (if any) so a stalled WASM module shows up within
+        # milliseconds, then keep waiting for a late acknowledgement until the timeout
+        stall_threshold = self.stall_threshold()
+        if stall_threshold is not None:
+            with self._changed:
+                if self._changed.wait_for(predicate, max(0.0, sent_at + stall_threshold - perf_counter())):
+                    return True
+        if stall_threshold is not None and not self.stalled:
+            logging.warning("MobiFlight WASM module stalled: no answer to %s after %.0f ms", command, stall_threshold * 1000.0)
+            self._set_stalled(True)
+        with self._changed:
+            return self._changed.wait_for(predicate, max(0.0, sent_at + self.ack_timeout - perf_counter()))
+
+    def _set_stalled(self, stalled: bool):
+        self.stalled = stalled
+        if self._on_health_change is not None:
+            self._on_health_change(stalled)
+
+SET_BATCHING = True          # merge set() expressions into shared MF.SimVars.Set commands; False = one command per set()
+SET_BATCH_DEADLINE = 0.005   # seconds a set() waits for further writes before its batch is sent
+SET_COMMAND_PREFIX = "MF.SimVars.Set."
+# "<number> (>L:name)" stores a constant: within one batch only the last such store to an LVAR
+# matters, as long as nothing in between reads or writes that LVAR
+_CONSTANT_STORE = re.compile(r"^\s*-?[0-9.]+(?:[eE][-+]?[0-9]+)?\s+\(>L:([^,)]+)(?:,[^)]*)?\)\s*$")
+_LVAR_REFERENCE = re.compile(r"\(>?L:([^,)]+)")
+
+class SetBatcher:
+    """Collects RPN set expressions for SET_BATCH_DEADLINE and sends them in as few MF.SimVars.Set
+    commands as fit into the command string.
+
+    Expressions are joined with spaces and run in order, so each one has to be self-contained.
+    A constant store replaces an earlier constant store to the same LVAR in that earlier position,
+    unless an expression queued in between refers to the LVAR; every other expression is sent
+    as written. An expression too long for a command on its own is dropped with an error.
+    """
+    def __init__(self, send, max_length: int, deadline: float = SET_BATCH_DEADLINE):
+        self._send = send              # send(command) -> Future, see MobiFlightVariableRequests.send_command
+        self.max_length = max_length   # longest command string, without its terminating NUL
+        self.deadline = deadline
+        self._pending: List[str] = []
+        self._stores: Dict[str, int] = {}  # LVAR name -> index in _pending of a constant store that may be replaced
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # keeps batches in order when flush() races the deadline
+        self._due = threading.Condition(self._lock)
+        self._flush_at: Optional[float] = None
+        self.writes = 0
+        self.deduplicated = 0
+        self.commands = 0
+        self.rejected = 0
+        self._thread = threading.Thread(target=self._run, name="MobiFlightSets", daemon=True)
+        self._thread.start()
+
+    def add(self, expression: str):
+        expression = expression.strip()
+        match = _CONSTANT_STORE.match(expression)
+        with self._lock:
+            self.writes += 1
+            if match:
+                name = match.group(1).strip()
+                index = self._stores.get(name)
+                if index is not None:
+                    self._pending[index] = expression
+                    self.deduplicated += 1
+                else:
+                    self._stores[name] = len(self._pending)
+                    self._pending.append(expression)
+            else:
+                # a store queued before this expression has to run before it
+                for name in _LVAR_REFERENCE.findall(expression):
+                    self._stores.pop(name.strip(), None)
+                self._pending.append(expression)
+            if self._flush_at is None:
+                self._flush_at = perf_counter() + self.deadline
+                self._due.notify()
+
+    def flush(self) -> List[concurrent.futures.Future]:
+        """Send everything collected so far; one future per command sent."""
+        with self._flush_lock:
+            with self._lock:
+                expressions = self._pending
+                self._pending = []
+                self._stores.clear()
+                self._flush_at = None
+            commands = self.pack(expressions)
+            self.commands += len(commands)
+            return [self._send(command) for command in commands]
+
+    def pack(self, expressions: Iterable[str]) -> List[str]:
+        commands = []
+        room = self.max_length - len(SET_COMMAND_PREFIX)
+        current = ""
+        for expression in expressions:
+            if len(expression) > room:
+                # it would overflow the Command area and the WASM module would run a truncated expression
+                self.rejected += 1
+                logging.error("LVAR write dropped, %s characters do not fit into one command: %s", len(expression), expression)
+                continue
+            if current and len(current) + 1 + len(expression) <= room:
+                current += " " + expression
+            else:
+                if current:
+                    commands.append(SET_COMMAND_PREFIX + current)
+                current = expression
+        if current:
+            commands.append(SET_COMMAND_PREFIX + current)
+        return commands
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "deduplicated": self.deduplicated,
+            "commands": self.commands,
+            "rejected": self.rejected,
+            "pending": len(self._pending),
+        }
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._flush_at is None:
+                    self._due.wait()
+                delay = self._flush_at - perf_counter()
+                if delay > 0:
+                    self._due.wait(delay)
+                    continue
+            self.flush()
+
+class LVarSnapshot(NamedTuple):
+    version: int                 # increases by one for every published batch of changes
+    values: Tuple[float, ...]    # indexed by variable id - 1, defaults until the first update, None for unused slots
+    changed: FrozenSet[int] = frozenset()  # ids whose value changed since the previous version
+
 class MobiFlightVariableRequests:
-    def __init__(self, simConnect: SimConnectMobiFlight):
+    def __init__(self, simConnect: SimConnectMobiFlight, probe_interval: Optional[float] = HEALTH_PROBE_INTERVAL):
         logging.info("MobiFlightVariableRequests __init__")
         self.sm = simConnect
         self.sim_vars = {}
@@ -79,29 +634,79 @@ class MobiFlightVariableRequests:
         self.DATA_STRING_SIZE = 256
         self.DATA_STRING_OFFSET = 0
         self.DATA_STRING_DEFINITION_ID = 0
+        # ids registered via register() that have not received their first value yet
+        self._pending_ids = set()
+        self.all_initialized = threading.Event()
+        self.all_initialized.set()
+        self._initialized_due = False  # set all_initialized once the batch completing it is published
+        # set from the SimConnect thread whenever a variable value changes
+        self.changed = threading.Event()
+        # double buffer: the pump thread writes values into _back_values and publishes an
+        # immutable copy as _snapshot once per dispatch batch; readers never see a half-applied batch
+        self._back_values: List[float] = []
+        self._back_dirty = False
+        self._back_changed = set()
+        self._snapshot = LVarSnapshot(0, ())
+        self._publish_lock = threading.Lock()  # guards every _back_* field: pump thread vs. main thread
+        self.recorder: Optional["BridgeRecorder"] = None
+        self.areas: List[LVarArea] = []
+        self._response_areas = {}  # response definition id -> LVarArea
+        self._block_areas = {}     # block definition id -> LVarArea
+        self._spare_areas = {}     # index -> LVarArea mapped by a failed reattach(), reused by _open_area()
+        self._defer_area_updates = False
+        # a stall or its end wakes wait_for_change() so the display can show it
+        self.commands = CommandQueue(self._write_command, probe_interval=probe_interval,
+                                     on_health_change=lambda stalled: self.changed.set())
+        self._registrations: List[concurrent.futures.Future] = []  # MF.SimVars.Add not confirmed yet
+        self._confirmed_ids = deque()  # ids whose Add was acknowledged, taken over by the pump thread
+        self.filtered_updates = 0  # values dropped by a variable's LVarFilter
+        self.sets = SetBatcher(self.send_command, self.DATA_STRING_SIZE - 1)
+        # registry (see LVAR_REGISTRY_FILE): token in slot 0 of every area, file the lists were saved to
+        self.registry_token: Optional[int] = None
+        self._registry_path: Optional[str] = None
+        self._token_reads = {}  # token definition id -> LVarArea still to answer
+        self._token_values = {}  # area index -> value read from slot 0
+        self._tokens_read = threading.Event()
         self.sm.register_client_data_handler(self.client_data_callback_handler)
+        self.sm.register_dispatch_complete_handler(self.publish_snapshot)
         self.initialize_client_data_areas()
 
-    def add_to_client_data_definition(self, definition_id, offset, size):
-        logging.info("add_to_client_data_definition definition_id=%s, offset=%s, size=%s", definition_id, offset, size)
+    def add_to_client_data_definition(self, definition_id, offset, size, epsilon=0.0):
+        logging.info("add_to_client_data_definition definition_id=%s, offset=%s, size=%s, epsilon=%s", definition_id, offset, size, epsilon)
         self.sm.dll.AddToClientDataDefinition(
             self.sm.hSimConnect,
             definition_id,
             offset,
-            size,
-            0,  # fEpsilon
+            # SimConnect only honours fEpsilon for typed datums, so a filtered LVAR is a FLOAT32
+            SIMCONNECT_CLIENTDATATYPE_FLOAT32 if epsilon else size,
+            epsilon,  # fEpsilon
             SIMCONNECT_UNUSED,  # DatumId
         )
 
-    def subscribe_to_data_change(self, data_area_id, request_id, definition_id):
+    def subscribe_to_data_change(self, data_area_id, request_id, definition_id,
+                                 period=SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ON_SET, flags=None):
         logging.info("subscribe_to_data_change data_area_id=%s, request_id=%s, definition_id=%s", data_area_id, request_id, definition_id)
         self.sm.dll.RequestClientData(
             self.sm.hSimConnect,
             data_area_id,
             request_id,
             definition_id,
-            SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ON_SET,
-            self.FLAG_CHANGED,
+            period,
+            self.FLAG_CHANGED if flags is None else flags,
+            0, # origin
+            0, # interval
+            0, # limit
+        )
+
+    def unsubscribe_from_data_change(self, data_area_id, request_id, definition_id):
+        logging.info("unsubscribe_from_data_change data_area_id=%s, request_id=%s, definition_id=%s", data_area_id, request_id, definition_id)
+        self.sm.dll.RequestClientData(
+            self.sm.hSimConnect,
+            data_area_id,
+            request_id,
+            definition_id,
+            SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_NEVER,
+            self.FLAG_DEFAULT,
             0, # origin
             0, # interval
             0, # limit
@@ -119,55 +724,472 @@ class MobiFlightVariableRequests:
             dataBytes,
         )
 
-    def send_command(self, command: str):
+    def send_command(self, command: str, area: Optional[LVarArea] = None) -> concurrent.futures.Future:
+        """Queue a command; it is written once all earlier commands were acknowledged.
+
+        Returns a future resolving to the CommandResult (see CommandQueue.put).
+        """
+        return self.commands.put(command, area or self.areas[0])
+
+    def ping(self, timeout: float = COMMAND_ACK_TIMEOUT * 2) -> float:
+        """Round trip to the WASM module in seconds; raises TimeoutError if it does not answer."""
+        return self.send_command("MF.Ping").result(timeout).round_trip
+
+    def probe_health(self) -> dict:
+        """Queue an MF.Ping right away when no command is in flight, and return
+        CommandQueue.health(). The queue also probes by itself after HEALTH_PROBE_INTERVAL idle."""
+        if self.commands.depth == 0:
+            self.send_command("MF.Ping")
+        return self.commands.health()
+
+    def wait_for_registration(self, timeout: Optional[float] = None) -> bool:
+        """Block until the WASM module confirmed every MF.SimVars.Add sent so far."""
+        registrations, self._registrations = self._registrations, []
+        done, not_done = concurrent.futures.wait(registrations, timeout)
+        failed = [future for future in done if future.exception() is not None]
+        self._registrations.extend(not_done)
+        if failed or not_done:
+            logging.warning("%s variable registrations not confirmed, %s still pending", len(failed), len(not_done))
+        return not failed and not not_done
+
+    def _write_command(self, command: str, area: Optional[LVarArea] = None):
         logging.info("send_command command=%s", command)
         data_byte_array = bytearray(command, "ascii")
         data_byte_array.extend(bytearray(self.DATA_STRING_SIZE - len(data_byte_array)))  # pad to fixed size
-        self.send_data(self.CLIENT_DATA_AREA_CMD, self.DATA_STRING_DEFINITION_ID, self.DATA_STRING_SIZE, bytes(data_byte_array))
+        command_id = self.CLIENT_DATA_AREA_CMD if area is None else area.command_id
+        self.send_data(command_id, self.DATA_STRING_DEFINITION_ID, self.DATA_STRING_SIZE, bytes(data_byte_array))
 
     def initialize_client_data_areas(self):
         logging.info("initialize_client_data_areas")
+        area = LVarArea(0, "MobiFlight")
+        self._map_area(area)
+        area.ready.set()
+        self.areas.append(area)
+        # delivered every frame, changed or not: the command queue's clock (see CommandQueue)
+        self.add_to_client_data_definition(FRAME_TICK_DEFINITION_ID, self.DATA_STRING_OFFSET, sizeof(FLOAT))
+        self.subscribe_to_data_change(area.response_id, FRAME_TICK_DEFINITION_ID, FRAME_TICK_DEFINITION_ID,
+                                      SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_VISUAL_FRAME, self.FLAG_DEFAULT)
+
+    def _map_lvars(self, area: LVarArea):
+        if not area.lvars_mapped:
+            self.sm.dll.MapClientDataNameToID(self.sm.hSimConnect, f"{area.client_name}.LVars".encode("ascii"), area.lvars_id)
+            area.lvars_mapped = True
+
+    def _map_area(self, area: LVarArea):
         # LVars area
-        self.sm.dll.MapClientDataNameToID(self.sm.hSimConnect, "MobiFlight.LVars".encode("ascii"), self.CLIENT_DATA_AREA_LVARS)
-        self.sm.dll.CreateClientData(self.sm.hSimConnect, self.CLIENT_DATA_AREA_LVARS, 4096, self.FLAG_DEFAULT)
+        self._map_lvars(area)
+        self.sm.dll.CreateClientData(self.sm.hSimConnect, area.lvars_id, LVAR_AREA_SIZE, self.FLAG_DEFAULT)
         # Command area
-        self.sm.dll.MapClientDataNameToID(self.sm.hSimConnect, "MobiFlight.Command".encode("ascii"), self.CLIENT_DATA_AREA_CMD)
-        self.sm.dll.CreateClientData(self.sm.hSimConnect, self.CLIENT_DATA_AREA_CMD, self.DATA_STRING_SIZE, self.FLAG_DEFAULT)
+        self.sm.dll.MapClientDataNameToID(self.sm.hSimConnect, f"{area.client_name}.Command".encode("ascii"), area.command_id)
+        self.sm.dll.CreateClientData(self.sm.hSimConnect, area.command_id, self.DATA_STRING_SIZE, self.FLAG_DEFAULT)
         # Response area
-        self.sm.dll.MapClientDataNameToID(self.sm.hSimConnect, "MobiFlight.Response".encode("ascii"), self.CLIENT_DATA_AREA_RESPONSE)
-        self.sm.dll.CreateClientData(self.sm.hSimConnect, self.CLIENT_DATA_AREA_RESPONSE, self.DATA_STRING_SIZE, self.FLAG_DEFAULT)
-        # Subscribe to WASM responses
-        self.add_to_client_data_definition(self.DATA_STRING_DEFINITION_ID, self.DATA_STRING_OFFSET, self.DATA_STRING_SIZE)
-        self.subscribe_to_data_change(self.CLIENT_DATA_AREA_RESPONSE, self.DATA_STRING_DEFINITION_ID, self.DATA_STRING_DEFINITION_ID)
+        self.sm.dll.MapClientDataNameToID(self.sm.hSimConnect, f"{area.client_name}.Response".encode("ascii"), area.response_id)
+        self.sm.dll.CreateClientData(self.sm.hSimConnect, area.response_id, self.DATA_STRING_SIZE, self.FLAG_DEFAULT)
+        # Subscribe to WASM responses; every response counts, also a repeated MF.Pong
+        self.add_to_client_data_definition(area.response_definition_id, self.DATA_STRING_OFFSET, self.DATA_STRING_SIZE)
+        self.subscribe_to_data_change(area.response_id, area.response_definition_id, area.response_definition_id,
+                                      flags=self.FLAG_DEFAULT)
+        self._response_areas[area.response_definition_id] = area
+
+    def _open_area(self) -> LVarArea:
+        """Register one more MobiFlight client channel for LVARs once all existing areas are full."""
+        if len(self.areas) >= MAX_LVAR_AREAS:
+            raise RuntimeError(f"All {MAX_LVAR_AREAS} LVAR areas ({MAX_LVAR_AREAS * LVAR_SLOTS_PER_AREA} variables) are in use")
+        # an area whose LVars reattach() already mapped keeps that mapping
+        area = self._spare_areas.pop(len(self.areas), None) or LVarArea(len(self.areas), f"{LVAR_CLIENT_PREFIX}{len(self.areas)}")
+        self.areas.append(area)
+        # the command may have to wait for earlier ones in the queue
+        timeout = CLIENT_ADD_TIMEOUT + self.commands.depth * COMMAND_ACK_TIMEOUT
+        try:
+            self.send_command("MF.Clients.Add." + area.client_name).result(timeout)
+        except (TimeoutError, concurrent.futures.TimeoutError):
+            self.areas.pop()
+            if area.lvars_mapped:
+                self._spare_areas[area.index] = area
+            raise RuntimeError(f"MobiFlight WASM module did not confirm client {area.client_name}")
+        self._map_area(area)
+        logging.info("Opened LVAR area %s (%s)", area.index, area.client_name)
+        return area
+
+    def _handle_response(self, area: LVarArea, response: str):
+        logging.debug("WASM response on %s: %s", area.client_name, response)
+        self.commands.acknowledge(area, response)
+        if response.startswith("MF.Clients.Add.") and response.endswith(".Finished"):
+            client_name = response[len("MF.Clients.Add."):-len(".Finished")]
+            for candidate in self.areas:
+                if candidate.client_name == client_name:
+                    candidate.ready.set()
+
+    def _read_string(self, client_data) -> str:
+        data_bytes = client_data_bytes(client_data, self.DATA_STRING_SIZE)
+        return data_bytes.split(b"\0", 1)[0].decode("ascii", "replace")
 
     # ---- BUGFIXED handler: always set float_value on first frame, no dropping first 0.0 ----
     def client_data_callback_handler(self, client_data):
-        if client_data.dwDefineID in self.sim_vars:
-            data_bytes = struct.pack("I", client_data.dwData[0])
-            float_data = struct.unpack('<f', data_bytes)[0]
-            float_value = round(float_data, 5)
-            sim_var = self.sim_vars[client_data.dwDefineID]
-            if not sim_var.initialized:
-                sim_var.initialized = True
-            self.sim_vars[client_data.dwDefineID].float_value = float_value
-            logging.debug("client_data_callback_handler %s, raw=%s", sim_var, float_value)
+        if client_data.dwDefineID in self._block_areas:
+            self._apply_block(self._block_areas[client_data.dwDefineID], client_data)
+        elif client_data.dwDefineID == FRAME_TICK_DEFINITION_ID:
+            self.commands.frame_tick()
+        elif client_data.dwDefineID in self.sim_vars:
+            float_data = struct.unpack('<f', client_data_bytes(client_data, sizeof(FLOAT)))[0]
+            self._apply_value(self.sim_vars[client_data.dwDefineID], float_data)
+        elif client_data.dwDefineID in self._response_areas:
+            self._handle_response(self._response_areas[client_data.dwDefineID], self._read_string(client_data))
+        elif client_data.dwDefineID in self._token_reads:
+            area = self._token_reads.pop(client_data.dwDefineID)
+            self._token_values[area.index] = struct.unpack('<f', client_data_bytes(client_data, sizeof(FLOAT)))[0]
+            if not self._token_reads:
+                self._tokens_read.set()
         else:
             logging.warning("client_data_callback_handler DefinitionID %s not found!", client_data.dwDefineID)
 
-    def get(self, variableString: str):
+    def _apply_value(self, sim_var: SimVariable, float_data: float):
+        if self.recorder is not None:
+            self.recorder.lvar(sim_var.id, sim_var.name, float_data)
+        lvar_filter = sim_var.filter
+        if lvar_filter is None:
+            float_value = round(float_data, 5)
+            is_change = not sim_var.initialized or sim_var.float_value != float_value
+        else:
+            float_value = round(lvar_filter.apply(float_data), 5)
+            # compared with the last delivered value, so slow drifts still add up to a change
+            is_change = not sim_var.initialized or abs(float_value - sim_var.float_value) > lvar_filter.epsilon
+            if not is_change:
+                self.filtered_updates += 1
+        if not sim_var.initialized:
+            sim_var.initialized = True
+            self._mark_initialized(sim_var.id)
+        if is_change:
+            sim_var.float_value = float_value
+            with self._publish_lock:
+                # clear_sim_variables() may have emptied the buffer since sim_var was looked up
+                if sim_var.id <= len(self._back_values):
+                    self._back_values[sim_var.id - 1] = float_value
+                    self._back_changed.add(sim_var.id)
+                    self._back_dirty = True
+        logging.debug("client_data_callback_handler %s, raw=%s", sim_var, float_value)
+
+    def _apply_block(self, area: LVarArea, client_data):
+        # decode the whole run of floats at once and only touch the slots whose bytes changed
+        data = client_data_bytes(client_data, area.block_size * sizeof(FLOAT))
+        data = data[:len(data) - len(data) % sizeof(FLOAT)]
+        values = array("f")
+        values.frombytes(data)
+        previous = area.block_bytes
+        area.block_bytes = data
+        if len(previous) != len(data):
+            changed = range(len(values))
+        else:
+            # XOR of the two blocks as one integer: each set bit lies in a changed slot, so the
+            # cost is per changed slot, not per slot
+            changed = []
+            diff = int.from_bytes(data, "little") ^ int.from_bytes(previous, "little")
+            while diff:
+                slot = ((diff & -diff).bit_length() - 1) // 32
+                changed.append(slot)
+                diff &= ~((1 << ((slot + 1) * 32)) - 1)
+        first_id = area.id_of(0)
+        for slot in changed:
+            sim_var = self.sim_vars.get(first_id + slot)
+            # until its Add is acknowledged a slot holds zeros or the value of a previous variable
+            if sim_var is not None and sim_var.confirmed:
+                self._apply_value(sim_var, values[slot])
+
+    def _confirm(self, id: int):
+        # pump thread, for every acknowledged MF.SimVars.Add
+        sim_var = self.sim_vars.get(id)
+        if sim_var is None or sim_var.confirmed:
+            return
+        sim_var.confirmed = True
+        if BLOCK_SUBSCRIPTION:
+            # _apply_block skipped the slot so far; the acknowledgement comes a frame after the
+            # Add, so the block bytes already hold what the WASM module wrote for it
+            area = self.areas[(id - 1) // LVAR_SLOTS_PER_AREA]
+            offset = (id - 1) % LVAR_SLOTS_PER_AREA * sizeof(FLOAT)
+            if offset + sizeof(FLOAT) <= len(area.block_bytes):
+                self._apply_value(sim_var, struct.unpack_from('<f', area.block_bytes, offset)[0])
+
+    def _set_back_value(self, id: int, value: Optional[float]):
+        # main thread: (re)initialise a slot, growing the buffer; published on the next dispatch
+        with self._publish_lock:
+            if len(self._back_values) < id:
+                self._back_values.extend([None] * (id - len(self._back_values)))
+            self._back_values[id - 1] = value
+            self._back_dirty = True
+
+    def publish_snapshot(self):
+        # called on the pump thread after each dispatch batch
+        while self._confirmed_ids:
+            self._confirm(self._confirmed_ids.popleft())
+        with self._publish_lock:
+            if self._back_dirty:
+                self._back_dirty = False
+                self._snapshot = LVarSnapshot(self._snapshot.version + 1, tuple(self._back_values), frozenset(self._back_changed))
+                self._back_changed.clear()
+                self.changed.set()
+        # only now can a waiter read the values that completed the initialization
+        if self._initialized_due:
+            self._initialized_due = False
+            if not self._pending_ids:
+                self.all_initialized.set()
+
+    def snapshot(self) -> LVarSnapshot:
+        """Latest consistent set of values; safe to call from any thread without locking."""
+        return self._snapshot
+
+    def indices(self, variables: Iterable[str]) -> List[int]:
+        """Positions of the given (registered) variables in LVarSnapshot.values."""
+        return [self.sim_var_name_to_id[name] - 1 for name in variables]
+
+    def _mark_initialized(self, id):
+        if id in self._pending_ids:
+            self._pending_ids.discard(id)
+            if not self._pending_ids:
+                logging.info("All registered variables initialized")
+                self._initialized_due = True  # all_initialized is set by publish_snapshot()
+
+    def _append_slot(self, area: LVarArea, variableString: str) -> int:
+        if not area.slots and self.registry_token is not None:
+            area.slots.append(str(self.registry_token))
+            area.pending_adds.append(str(self.registry_token))
+        area.slots.append(variableString)
+        area.pending_adds.append(variableString)
+        return len(area.slots) - 1
+
+    def _allocate_slot(self, variableString: str) -> Tuple[LVarArea, int]:
+        # 1. append to an area: the WASM module appends too, so a single Add keeps both sides in step
+        for area in self.areas:
+            if area.ready.is_set() and len(area.slots) < LVAR_SLOTS_PER_AREA:
+                return area, self._append_slot(area, variableString)
+        # 2. reuse a freed slot; the area's list is re-sent to the WASM module by _update_areas()
+        for area in self.areas:
+            if area.free:
+                slot = heapq.heappop(area.free)
+                area.slots[slot] = variableString
+                area.needs_rebuild = True
+                return area, slot
+        # 3. open another client channel
+        area = self._open_area()
+        return area, self._append_slot(area, variableString)
+
+    def _update_areas(self):
+        # Resize block subscriptions first so the values the WASM module writes for new slots
+        # are delivered, then send the queued Adds. The WASM module has no per-variable remove,
+        # only Clear + Add in order: an area that reused freed slots gets its whole slot list
+        # re-sent, with placeholders for the still-free ones.
+        if any(area.needs_rebuild or area.pending_adds for area in self.areas):
+            self._invalidate_registry()
+        for area in self.areas:
+            if area.needs_rebuild:
+                while area.slots and area.slots[-1] is None:
+                    area.slots.pop()  # trailing free slots become plain appendable slots again
+                area.free = [slot for slot in area.free if slot < len(area.slots)]
+                heapq.heapify(area.free)
+            if BLOCK_SUBSCRIPTION and (area.block_stale or area.block_size != len(area.slots)):
+                self._subscribe_block(area)
+            if area.needs_rebuild:
+                area.needs_rebuild = False
+                area.pending_adds = []
+                logging.info("Rebuilding LVAR area %s with %s slots", area.index, len(area.slots))
+                self.send_command("MF.SimVars.Clear", area)
+                for name in area.slots:
+                    self._send_add(area, name)
+            else:
+                for name in area.pending_adds:
+                    self._send_add(area, name)
+                area.pending_adds = []
+
+    def _send_add(self, area: LVarArea, name: Optional[str]):
+        future = self.send_command("MF.SimVars.Add." + (LVAR_PLACEHOLDER if name is None else name), area)
+        id = self.sim_var_name_to_id.get(name)
+        if id is not None:
+            def confirmed(done: concurrent.futures.Future):
+                if done.exception() is None:
+                    self._confirmed_ids.append(id)
+            future.add_done_callback(confirmed)
+        self._registrations.append(future)
+
+    def _subscribe_block(self, area: LVarArea):
+        # One definition over the used part of the area, checked once per visual frame: the WASM
+        # module sets every LVAR separately, so ON_SET would still mean one packet per variable.
+        # Re-requesting restarts change detection, so the next delivery carries every slot.
+        definition_id = area.block_definition_id
+        self.sm.dll.ClearClientDataDefinition(self.sm.hSimConnect, definition_id)
+        area.block_size = len(area.slots)
+        area.block_bytes = b""
+        area.block_stale = False
+        if area.block_size:
+            for offset, size, epsilon in self._block_datums(area):
+                self.add_to_client_data_definition(definition_id, offset, size, epsilon)
+            self.subscribe_to_data_change(area.lvars_id, definition_id, definition_id,
+                                          SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_VISUAL_FRAME)
+            self._block_areas[definition_id] = area
+        else:
+            self.unsubscribe_from_data_change(area.lvars_id, definition_id, definition_id)
+            self._block_areas.pop(definition_id, None)
+
+    def _block_datums(self, area: LVarArea):
+        # The block stays one contiguous run of bytes, but every slot with an epsilon becomes its
+        # own FLOAT32 datum so SimConnect skips deliveries where only such slots moved a little.
+        run_start = 0
+        first_id = area.id_of(0)
+        for slot in range(area.block_size):
+            sim_var = self.sim_vars.get(first_id + slot)
+            epsilon = sim_var.filter.epsilon if sim_var is not None and sim_var.filter is not None else 0.0
+            if epsilon:
+                if run_start < slot:
+                    yield run_start * sizeof(FLOAT), (slot - run_start) * sizeof(FLOAT), 0.0
+                yield slot * sizeof(FLOAT), sizeof(FLOAT), epsilon
+                run_start = slot + 1
+        if run_start < area.block_size:
+            yield run_start * sizeof(FLOAT), (area.block_size - run_start) * sizeof(FLOAT), 0.0
+
+    def _subscribe_variable(self, area: LVarArea, slot: int):
+        # per-variable mode: one definition and request per slot; a reused slot keeps its
+        # definition unless the epsilon differs
+        id = area.id_of(slot)
+        sim_var = self.sim_vars[id]
+        epsilon = sim_var.filter.epsilon if sim_var.filter is not None else 0.0
+        if area.defined.get(slot) != epsilon:
+            if slot in area.defined:
+                self.sm.dll.ClearClientDataDefinition(self.sm.hSimConnect, id)
+            area.defined[slot] = epsilon
+            self.add_to_client_data_definition(id, slot * sizeof(FLOAT), sizeof(FLOAT), epsilon)
+        self.subscribe_to_data_change(area.lvars_id, id, id)
+
+    def set_filter(self, variableString: str, lvar_filter: Optional[LVarFilter]):
+        """Change (or with None remove) the LVarFilter of a registered variable."""
+        id = self.sim_var_name_to_id[variableString]
+        sim_var = self.sim_vars[id]
+        if sim_var.filter == lvar_filter:
+            return
+        sim_var.filter = lvar_filter
+        area = self.areas[(id - 1) // LVAR_SLOTS_PER_AREA]
+        if BLOCK_SUBSCRIPTION:
+            area.block_stale = True
+            if not self._defer_area_updates:
+                self._update_areas()
+        else:
+            self._subscribe_variable(area, (id - 1) % LVAR_SLOTS_PER_AREA)
+
+    def _add_variable(self, variableString: str, default=None, lvar_filter: Optional[LVarFilter] = None,
+                      pending: bool = False):
+        area, slot = self._allocate_slot(variableString)
+        id = area.id_of(slot)
+        if pending:
+            # before the variable is visible to the SimConnect thread, so its first value counts
+            self._pending_ids.add(id)
+            self.all_initialized.clear()
+        self.sim_vars[id] = SimVariable(id, variableString, default=default, filter=lvar_filter)
+        self.sim_var_name_to_id[variableString] = id
+        self._set_back_value(id, default)  # publish the new slot with its default on the next dispatch
+        if BLOCK_SUBSCRIPTION:
+            area.block_stale = True
+        else:
+            self._subscribe_variable(area, slot)
+        if not self._defer_area_updates:
+            self._update_areas()
+        return id
+
+    def unregister(self, variables: Iterable[str]) -> int:
+        """Unsubscribe variables and free their slots for later register()/get() calls.
+
+        The WASM module keeps evaluating a freed slot until the slot is reused (or the area is
+        cleared), so this only stops the updates; it never needs a clear_sim_variables().
+        """
+        count = 0
+        for variableString in variables:
+            id = self.sim_var_name_to_id.pop(variableString, None)
+            if id is None:
+                continue
+            del self.sim_vars[id]
+            area = self.areas[(id - 1) // LVAR_SLOTS_PER_AREA]
+            slot = (id - 1) % LVAR_SLOTS_PER_AREA
+            # in block mode the block keeps covering the slot and _apply_block skips it
+            if not BLOCK_SUBSCRIPTION:
+                self.unsubscribe_from_data_change(area.lvars_id, id, id)
+            area.slots[slot] = None
+            heapq.heappush(area.free, slot)
+            self._set_back_value(id, None)
+            self._mark_initialized(id)
+            count += 1
+        logging.info("unregister %s variables", count)
+        return count
+
+    def occupancy(self) -> dict:
+        """Slot usage per LVAR area and in total."""
+        areas = [{
+            "client": area.client_name,
+            "capacity": LVAR_SLOTS_PER_AREA,
+            "used": area.used,
+            "free": len(area.free),
+            "unallocated": LVAR_SLOTS_PER_AREA - len(area.slots),
+        } for area in self.areas]
+        return {
+            "areas": areas,
+            "capacity": MAX_LVAR_AREAS * LVAR_SLOTS_PER_AREA,
+            "used": sum(area["used"] for area in areas),
+            "free": sum(area["free"] for area in areas),
+        }
+
+    def register(self, variables: Union[Iterable[str], Mapping[str, float]], default: Optional[float] = None,
+                 filters: Union[LVarFilter, Mapping[str, LVarFilter], None] = None) -> List[int]:
+        """Subscribe a whole set of variables up front without waiting for their values.
+
+        `variables` is either a list of names (all using `default`) or a mapping of
+        name -> default value. `filters` is one LVarFilter for all of them or a mapping of
+        name -> LVarFilter; variables without one report every change. Use
+        wait_until_initialized() to block until every registered variable has received its
+        first value from the WASM module.
+        """
+        if isinstance(variables, Mapping):
+            items = list(variables.items())
+        else:
+            items = [(name, default) for name in variables]
+        logging.info("register %s variables", len(items))
+        ids = []
+        self._defer_area_updates = True  # update each touched area once, not once per variable
+        try:
+            for variableString, var_default in items:
+                lvar_filter = filters.get(variableString) if isinstance(filters, Mapping) else filters
+                if variableString in self.sim_var_name_to_id:
+                    id = self.sim_var_name_to_id[variableString]
+                    self.sim_vars[id].default = var_default
+                    if not self.sim_vars[id].initialized:
+                        self._set_back_value(id, var_default)
+                    self.set_filter(variableString, lvar_filter)
+                else:
+                    id = self._add_variable(variableString, var_default, lvar_filter, pending=True)
+                ids.append(id)
+        finally:
+            self._defer_area_updates = False
+            self._update_areas()
+        return ids
+
+    def wait_until_initialized(self, timeout: Optional[float] = None) -> bool:
+        """Block until all registered variables have a value, or until timeout (seconds) expires."""
+        done = self.all_initialized.wait(timeout)
+        if not done:
+            missing = [self.sim_vars[id].name for id in list(self._pending_ids) if id in self.sim_vars]
+            logging.warning("wait_until_initialized timed out, %s variables still pending: %s", len(missing), missing)
+        return done
+
+    def wait_for_change(self, timeout: Optional[float] = None) -> bool:
+        """Block until any variable changed since the last call, or until timeout (seconds) expires."""
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
+
+    def get(self, variableString: str, wait: bool = True):
         if variableString not in self.sim_var_name_to_id:
             # add new variable
-            id = len(self.sim_vars) + 1
-            self.sim_vars[id] = SimVariable(id, variableString)
-            self.sim_var_name_to_id[variableString] = id
-            # subscribe to variable data change
-            offset = (id - 1) * sizeof(FLOAT)
-            self.add_to_client_data_definition(id, offset, sizeof(FLOAT))
-            self.subscribe_to_data_change(self.CLIENT_DATA_AREA_LVARS, id, id)
-            self.send_command("MF.SimVars.Add." + variableString)
+            self._add_variable(variableString)
         # determine id and return value
         variable_id = self.sim_var_name_to_id[variableString]
         sim_var = self.sim_vars[variable_id]
+        if not wait:
+            # non-blocking: latest cached value, or declared default until the first update arrives
+            return sim_var.default if sim_var.float_value is None else sim_var.float_value
         wait_counter = 0
         while wait_counter < 50:  # wait max 500ms
             if sim_var.float_value is None:
@@ -182,13 +1204,156 @@ class MobiFlightVariableRequests:
 
     def set(self, variableString):
         logging.debug("set: %s", variableString)
-        self.send_command("MF.SimVars.Set." + variableString)
+        if SET_BATCHING:
+            self.sets.add(variableString)
+        else:
+            self.send_command(SET_COMMAND_PREFIX + variableString)
+
+    def set_many(self, expressions: Iterable[str]) -> List[concurrent.futures.Future]:
+        """Write several RPN expressions as one action and send them right away."""
+        if not SET_BATCHING:
+            return [self.send_command(SET_COMMAND_PREFIX + expression) for expression in expressions]
+        for expression in expressions:
+            self.set(expression)
+        return self.flush_sets()
+
+    def flush_sets(self) -> List[concurrent.futures.Future]:
+        """Send pending set() expressions without waiting for SET_BATCH_DEADLINE."""
+        return self.sets.flush()
+
+    def reattach(self, path: str, variables: Iterable[str], timeout: float = REGISTRY_VERIFY_TIMEOUT) -> bool:
+        """Adopt the slot lists saved by save_registry() if the WASM module still evaluates them.
+
+        The lists are only reused when every area reads back the saved token from its slot 0;
+        adopted variables not in `variables` are unregistered. Otherwise every area is cleared
+        and the bridge starts cold with a new token. Either way, register() afterwards.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                registry = json.load(file)
+        except (OSError, ValueError) as err:
+            logging.info("No LVAR registry to reattach to (%s)", err)
+            registry = None
+        if registry is not None and self._adopt_registry(registry, timeout):
+            self._registry_path = path
+            wanted = set(variables)
+            self.unregister([name for name in list(self.sim_var_name_to_id) if name not in wanted])
+            logging.info("Reattached to %s registered variables in %s areas", len(self.sim_vars), len(self.areas))
+            return True
+        self.clear_sim_variables()
+        self.registry_token = random.randrange(1, 1 << 24)  # exact as a float
+        return False
+
+    def _adopt_registry(self, registry: dict, timeout: float) -> bool:
+        token = registry.get("token")
+        entries = registry.get("areas", [])
+        if not isinstance(token, int) or not entries or len(entries) > MAX_LVAR_AREAS:
+            return False
+        opened = len(self.areas)
+        while len(self.areas) < len(entries):
+            self.areas.append(LVarArea(len(self.areas), f"{LVAR_CLIENT_PREFIX}{len(self.areas)}"))
+        if any(area.client_name != entry.get("client") or entry.get("slots", [None])[:1] != [str(token)]
+               for area, entry in zip(self.areas, entries)):
+            del self.areas[opened:]
+            return False
+        # only map the LVars of the other clients to read their tokens; the areas are created by
+        # the WASM module's MF.Clients.Add, never by the bridge before it
+        for area in self.areas[opened:]:
+            self._map_lvars(area)
+        # handshake: read slot 0 of every area once and compare it with the token
+        self._token_values = {}
+        self._tokens_read.clear()
+        for area in self.areas[:len(entries)]:
+            definition_id = REGISTRY_DEFINITION_BASE + area.index
+            self.sm.dll.ClearClientDataDefinition(self.sm.hSimConnect, definition_id)
+            self.add_to_client_data_definition(definition_id, 0, sizeof(FLOAT))
+            self._token_reads[definition_id] = area
+            self.subscribe_to_data_change(area.lvars_id, definition_id, definition_id,
+                                          SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ONCE, self.FLAG_DEFAULT)
+        self._tokens_read.wait(timeout)
+        self._token_reads.clear()
+        mismatched = [area.client_name for area in self.areas[:len(entries)] if self._token_values.get(area.index) != token]
+        if mismatched:
+            logging.info("LVAR registry does not match the WASM module (%s), starting cold", ", ".join(mismatched))
+            # _open_area() reuses their LVars mapping after MF.Clients.Add
+            for area in self.areas[opened:]:
+                self._spare_areas[area.index] = area
+            del self.areas[opened:]
+            return False
+        # the WASM clients of the last run still exist: map the rest of their areas without MF.Clients.Add
+        for area in self.areas[opened:]:
+            self._map_area(area)
+        for area, entry in zip(self.areas, entries):
+            area.slots = list(entry["slots"])
+            area.free = [slot for slot, name in enumerate(area.slots) if name is None]
+            heapq.heapify(area.free)
+            area.ready.set()
+            area.block_stale = True
+            for slot, name in enumerate(area.slots[1:], 1):
+                if name is None:
+                    continue
+                id = area.id_of(slot)
+                self.sim_vars[id] = SimVariable(id, name)
+                self.sim_vars[id].confirmed = True  # the WASM module still evaluates it
+                self.sim_var_name_to_id[name] = id
+                with self._publish_lock:
+                    if len(self._back_values) < id:
+                        self._back_values.extend([None] * (id - len(self._back_values)))
+                self._pending_ids.add(id)
+                self.all_initialized.clear()
+                if not BLOCK_SUBSCRIPTION:
+                    # ON_SET only fires on the next write, so read the value the WASM module already wrote
+                    self._subscribe_variable(area, slot)
+                    self.subscribe_to_data_change(area.lvars_id, REATTACH_REQUEST_BASE + id, id,
+                                                  SIMCONNECT_CLIENT_DATA_PERIOD.SIMCONNECT_CLIENT_DATA_PERIOD_ONCE, self.FLAG_DEFAULT)
+        self.registry_token = token
+        self._update_areas()
+        return True
+
+    def save_registry(self, path: str):
+        """Save the slot lists of all areas for reattach(); call once the WASM module confirmed them."""
+        if self.registry_token is None:
+            return
+        registry = {
+            "token": self.registry_token,
+            "areas": [{"client": area.client_name, "slots": area.slots} for area in self.areas],
+        }
+        temporary = path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(registry, file)
+        os.replace(temporary, path)
+        self._registry_path = path
+        logging.info("Saved LVAR registry with %s variables to %s", len(self.sim_vars), path)
+
+    def _invalidate_registry(self):
+        # the WASM module's lists are about to differ from the saved ones; a crash before the next
+        # save_registry() must not leave a registry behind that reattach() would trust
+        if self._registry_path is not None:
+            try:
+                os.remove(self._registry_path)
+            except OSError:
+                pass
+            self._registry_path = None
 
     def clear_sim_variables(self):
         logging.info("clear_sim_variables")
+        self._invalidate_registry()
         self.sim_vars.clear()
         self.sim_var_name_to_id.clear()
-        self.send_command("MF.SimVars.Clear")
+        self._pending_ids.clear()
+        self.all_initialized.set()
+        with self._publish_lock:
+            self._back_values = []
+            self._back_dirty = False
+            self._back_changed.clear()
+            self._snapshot = LVarSnapshot(self._snapshot.version + 1, ())
+        # areas stay registered and keep their definitions; only their slot lists start over
+        for area in self.areas:
+            area.slots = []
+            area.free = []
+            area.pending_adds = []
+            area.needs_rebuild = False
+            self.send_command("MF.SimVars.Clear", area)
 
 # ========================= Logging =========================
 def setupLogging(logFileName):
@@ -231,39 +1396,65 @@ def put_text_center(grid: List[List[Cell]], text: str, row: int, colour="a", siz
     put_text(grid, text, row, col, colour=colour, size=size)
 
 
-def grid_to_payload(grid: List[List[Cell]]) -> str:
+def grid_to_payload_reference(grid: List[List[Cell]]) -> str:
     return json.dumps({"Target": "Display", "Data": list(chain(*grid))})
 
+# JSON text of every distinct cell seen so far, e.g. ("A", "a", 0) -> '["A", "a", 0]'. Keys are only
+# str and int: 0, 0.0 and False (1, 1.0, True) are equal keys but encode differently
+_CELL_JSON_CACHE: dict = {}
+_CELL_JSON_CACHE_TYPES = frozenset((str, int))
+_CELL_JSON_CACHE_MAX = 4096  # safety bound, a real page uses a few dozen distinct cells
+_PAYLOAD_PREFIX = '{"Target": "Display", "Data": ['
+_PAYLOAD_SUFFIX = ']}'
+
+def grid_to_payload(grid: List[List[Cell]]) -> str:
+    # Same bytes as grid_to_payload_reference(), but each distinct cell is json-encoded only once
+    if not _CELL_JSON_CACHE_TYPES.issuperset(map(type, chain.from_iterable(chain.from_iterable(grid)))):
+        return grid_to_payload_reference(grid)
+    cache = _CELL_JSON_CACHE
+    parts = []
+    append = parts.append
+    for row in grid:
+        for cell in row:
+            key = tuple(cell)
+            fragment = cache.get(key)
+            if fragment is None:
+                fragment = json.dumps(cell)
+                if len(cache) >= _CELL_JSON_CACHE_MAX:
+                    cache.clear()
+                cache[key] = fragment
+            append(fragment)
+    return _PAYLOAD_PREFIX + ", ".join(parts) + _PAYLOAD_SUFFIX
+
+def benchmark_grid_to_payload(iterations: int = 5000):
+    grid = empty_grid()
+    clear_area_with_spaces(grid, 0, CDU_ROWS - 1)
+    put_text(grid, "ENG FAIL    ", 0, 0)
+    put_text(grid, "FADEC FAIL ", 1, 13)
+    put_text_center(grid, "MISC", 6, colour="k")
+    put_text(grid, "P/S-HTR-P", 10, 0, colour="g")
+    put_text_center(grid, "CDS PASSED", 11, colour="g")
+    if grid_to_payload(grid) != grid_to_payload_reference(grid):
+        raise AssertionError("grid_to_payload differs from grid_to_payload_reference")
+    results = {}
+    for name, encoder in (("json.dumps", grid_to_payload_reference), ("cached cells", grid_to_payload)):
+        start = perf_counter()
+        for _ in range(iterations):
+            encoder(grid)
+        results[name] = (perf_counter() - start) / iterations
+    for name, per_frame in results.items():
+        print(f"{name:>14}: {per_frame * 1e6:8.1f} us/frame")
+    print(f"{'speed-up':>14}: {results['json.dumps'] / results['cached cells']:8.2f}x")
+
 # ========================= Rolling list layout =========================
-LEFT_COL_START  = 0
-RIGHT_COL_START = 13
 CONTENT_FIRST_ROW = 0
 CONTENT_LAST_ROW  = 5
-MAX_ROWS = CONTENT_LAST_ROW - CONTENT_FIRST_ROW + 1  
 
 def clear_area_with_spaces(grid, r0, r1, c0=0, c1=CDU_COLUMNS, colour="w", size=0):
     for r in range(r0, r1 + 1):
         for c in range(c0, c1):
             grid[r][c] = [" ", colour, size]
 
-def compact_labels(pairs):
-    return [label for val, label in pairs if val == 1]
-
-def draw_columns(grid: List[List[Cell]], left_labels: List[str], right_labels: List[str]):
-    clear_area_with_spaces(grid, CONTENT_FIRST_ROW, CONTENT_LAST_ROW)
-    # LEFT 12 chars
-    row = CONTENT_FIRST_ROW
-    for lbl in left_labels[:MAX_ROWS]:
-        put_text(grid, lbl[:12].ljust(12), row, LEFT_COL_START, colour="a", size=LARGE)
-        row += 1
-        if row > CONTENT_LAST_ROW: break
-    # RIGHT 11 chars
-    row = CONTENT_FIRST_ROW
-    for lbl in right_labels[:MAX_ROWS]:
-        put_text(grid, lbl[:11].ljust(11), row, RIGHT_COL_START, colour="a", size=LARGE)
-        row += 1
-        if row > CONTENT_LAST_ROW: break
-
 def as01(v) -> int:
 	try:
 		if v is None: return 0
@@ -284,256 +1475,670 @@ def as01(v) -> int:
 	except: return 0
 
 
-# ========================= Simple persistent WebSocket =========================
+# ========================= Annunciator table =========================
+# LVAR -> label -> list/column/colour mapping, loaded from a JSON file next to this script
+ANNUNCIATOR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "microsoft_aircraft_ec135.json")
+CHUNK_BITS = 8  # label lookup tables cover 8 annunciators each (256 entries per table)
+
+class AnnunciatorList:
+    """Compacted (rolling) list of labels whose annunciators occupy bits shift..shift+count-1."""
+    def __init__(self, name: str, labels: List[str], shift: int, colour: str, width: int, columns: List[Tuple[int, int]], rows: int):
+        self.name = name
+        self.shift = shift
+        self.count = len(labels)
+        self.colour = colour
+        self.width = width
+        self.columns = columns
+        self.rows = rows
+        # chunk tables: for every 8-bit slice of this list's mask, the labels it contributes, in list order
+        self.chunks: List[Tuple[int, List[Tuple[str, ...]]]] = []
+        for chunk_start in range(0, self.count, CHUNK_BITS):
+            chunk_labels = labels[chunk_start:chunk_start + CHUNK_BITS]
+            table = [tuple(label for bit, label in enumerate(chunk_labels) if value & (1 << bit))
+                     for value in range(1 << len(chunk_labels))]
+            self.chunks.append((shift + chunk_start, table))
+
+    def labels(self, mask: int) -> Tuple[str, ...]:
+        result = ()
+        for chunk_shift, table in self.chunks:
+            result += table[(mask >> chunk_shift) & (len(table) - 1)]
+        return result
+
+class AnnunciatorTable:
+    """Annunciator definition compiled into one bitmask: bit i is set when test i holds."""
+    def __init__(self, config: dict):
+        self.name = config.get("aircraft", "")
+        self.page_lvar: str = config["page_lvar"]
+        self.page_size: int = config.get("page_size", 6)
+        self.lvars: List[str] = []  # distinct LVARs, in the order evaluate() expects their values
+        self._tests: List[Tuple[int, int]] = []  # per bit: (index into lvars, as01 level that sets it)
+        self.flag_bits = {name: self._add_test(flag["lvar"], flag.get("when", 1))
+                          for name, flag in config.get("flags", {}).items()}
+        self.lists: List[AnnunciatorList] = []
+        for entry in config.get("lists", []):
+            shift = len(self._tests)
+            labels = []
+            for lvar, label in entry["items"]:
+                self._add_test(lvar, 1)
+                labels.append(label)
+            columns = [(row, col) for row, col in entry["columns"]]
+            self.lists.append(AnnunciatorList(entry["name"], labels, shift, entry.get("colour", "a"),
+                                              entry.get("width", 11), columns, entry.get("rows", self.page_size)))
+        self.indicators = [(self._add_test(ind["lvar"], ind.get("when", 1)), ind["label"], ind["row"], ind["col"], ind.get("colour", "g"))
+                           for ind in config.get("indicators", [])]
+
+    def _add_test(self, lvar: str, when: int) -> int:
+        if lvar not in self.lvars:
+            self.lvars.append(lvar)
+        self._tests.append((self.lvars.index(lvar), when))
+        return 1 << (len(self._tests) - 1)
+
+    @property
+    def all_lvars(self) -> List[str]:
+        return [self.page_lvar] + [lvar for lvar in self.lvars if lvar != self.page_lvar]
+
+    def evaluate(self, values) -> int:
+        """Pack raw LVAR values (aligned with self.lvars) into the annunciator bitmask."""
+        levels = [as01(v) for v in values]
+        mask = 0
+        for bit, (index, when) in enumerate(self._tests):
+            if levels[index] == when:
+                mask |= 1 << bit
+        return mask
+
+    def flag(self, mask: int, name: str) -> bool:
+        return bool(mask & self.flag_bits[name])
+
+def load_annunciator_table(path: str = ANNUNCIATOR_FILE) -> AnnunciatorTable:
+    logging.info("Loading annunciator table %s", path)
+    with open(path, "r", encoding="utf-8") as file:
+        return AnnunciatorTable(json.load(file))
+
+def render_cas_page(table: AnnunciatorTable, mask: int, page: int) -> List[List[Cell]]:
+    grid = empty_grid()
+    put_text_center(grid, "MISC", 6, colour="k", size=LARGE)
+    if not table.flag(mask, "cds_power"):  # CDS has no power
+        return grid
+    clear_area_with_spaces(grid, CONTENT_FIRST_ROW, CONTENT_LAST_ROW)
+
+    # rolling lists, paged by cdsPage (0,1,2); each page fills the list's columns top to bottom
+    start = page * table.page_size
+    for annunciators in table.lists:
+        visible = annunciators.labels(mask)[start:start + table.page_size]
+        for i, label in enumerate(visible):
+            column, row = divmod(i, annunciators.rows)
+            if column >= len(annunciators.columns):
+                break
+            first_row, col = annunciators.columns[column]
+            put_text(grid, label[:annunciators.width].ljust(annunciators.width), first_row + row, col,
+                     colour=annunciators.colour, size=LARGE)
+
+    # fixed-position indicators (green block)
+    for bit, label, row, col, colour in table.indicators:
+        if mask & bit:
+            put_text(grid, label, row, col, colour=colour, size=LARGE)
+
+    if table.flag(mask, "cds_test_pending"):
+        row11, row12, row13 = "CDS PASSED", "INP PASSED", None
+    else:
+        row11 = "LDG L EXT" if table.flag(mask, "landing_light_extended") else "LDG L RET"
+        air_cond = "AIR COND " if table.flag(mask, "air_cond") else None
+        if table.flag(mask, "landing_light"):
+            row12, row13 = "LDG LIGHT", air_cond
+        else:
+            row12, row13 = air_cond, None
+
+    for r, txt in ((11, row11), (12, row12), (13, row13)):
+        if txt: put_text_center(grid, txt, r, colour="g", size=LARGE)
+    return grid
+
+def render_stall_page() -> List[List[Cell]]:
+    # shown instead of the CAS page while the MobiFlight WASM module does not answer, since the
+    # LVARs stop updating then and the annunciators would show a stale state
+    grid = empty_grid()
+    clear_area_with_spaces(grid, 0, CDU_ROWS-1)
+    put_text_center(grid, "MOBIFLIGHT", 6, colour="a", size=LARGE)
+    put_text_center(grid, "NOT RESPONDING", 7, colour="a", size=LARGE)
+    return grid
+
+
+class McduFrame(NamedTuple):
+    rows: Tuple[tuple, ...]  # one tuple of (char, colour, size) cells per row
+    payload: str             # JSON sent to the MCDU
+
+def grid_to_frame(grid: List[List[Cell]]) -> McduFrame:
+    rows = tuple(tuple(tuple(cell) for cell in row) for row in grid)
+    return McduFrame(rows, grid_to_payload(rows))
+
+PAGE_CACHE_SIZE = 256  # distinct CAS states kept; a flight typically cycles through a handful
+
+@lru_cache(maxsize=PAGE_CACHE_SIZE)
+def render_cas_frame(table: AnnunciatorTable, mask: int, page: int) -> McduFrame:
+    # The mask already carries the CDS breaker and self-test acknowledge bits, so
+    # (mask, page) identifies the page completely. Hit/miss counters: render_cas_frame.cache_info()
+    return grid_to_frame(render_cas_page(table, mask, page))
+
+# ========================= Asynchronous MCDU WebSocket =========================
 class McduSocket:
-    def __init__(self, url: str, connect_timeout: float = 2.0):
+    """MCDU WebSocket client running on its own asyncio loop in a background thread.
+
+    The render loop hands frames over with send_frame()/send_grid(), which never block on
+    network I/O: the frame goes into a single-slot mailbox (a newer frame replaces one that
+    has not been sent yet) and a dedicated sender task writes it to the socket. Keepalive
+    pings run on the connection's own timer and reconnects happen on their own schedule.
+    """
+    def __init__(self, url: str, connect_timeout: float = 2.0, stats_interval: float = 60.0,
+                 ping_interval: float = 20.0, reconnect_interval: float = 2.0):
         self.url = url
-        self.ws: Optional[WebSocket] = None
+        self.ws: Optional[ws_client.ClientConnection] = None
         self.connect_timeout = connect_timeout
-        self._last_ping = 0.0
-        self._ping_interval = 20.0
+        self._ping_interval = ping_interval
+        self._reconnect_interval = reconnect_interval
+        # last frame taken for sending, one tuple per row; None forces the next send
+        self._last_rows: Optional[Tuple[tuple, ...]] = None
+        # per-row change flags of the most recent send_frame() call
+        self.dirty_rows: List[bool] = [True] * CDU_ROWS
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.frames_coalesced = 0  # frames replaced in the mailbox before they were sent
+        self._stats_interval = stats_interval
+        self._last_stats = time()
+        # asyncio side, created by start()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()  # guards _mailbox, _latest and _last_rows across both threads
+        self._mailbox: Optional[McduFrame] = None
+        self._latest: Optional[McduFrame] = None  # re-sent after a reconnect
+        self._wakeup: Optional[asyncio.Event] = None
+        self._connected: Optional[asyncio.Event] = None
+        self.recorder: Optional["BridgeRecorder"] = None
 
-    def _connect(self):
-        logging.info(f"Connecting to MCDU at {self.url}")
-        self.ws = create_connection(self.url, timeout=self.connect_timeout)
-        self.ws.settimeout(1.0)
-        logging.info("MCDU connected.")
+    # ---- producer side (render thread) ----
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._thread_main, name="McduSocket", daemon=True)
+        self._thread.start()
+        self._ready.wait()
 
-    def _ensure(self):
-        if self.ws is None:
-            self._connect()
+    def close(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._stop)
+            self._thread.join(timeout=5.0)
+            self._thread = None
 
-    def _maybe_ping(self):
+    def _maybe_report_stats(self):
         now = time()
-        if now - self._last_ping >= self._ping_interval:
+        if now - self._last_stats >= self._stats_interval:
+            self._last_stats = now
+            stats = self.stats()
+            logging.info("MCDU frames sent=%s skipped=%s coalesced=%s (%.1f%% skipped)",
+                         stats["sent"], stats["skipped"], stats["coalesced"], stats["skipped_ratio"] * 100.0)
+
+    def stats(self) -> dict:
+        total = self.frames_sent + self.frames_skipped
+        return {
+            "sent": self.frames_sent,
+            "skipped": self.frames_skipped,
+            "coalesced": self.frames_coalesced,
+            "skipped_ratio": self.frames_skipped / total if total else 0.0,
+            "dirty_rows": sum(self.dirty_rows),
+        }
+
+    def send_grid(self, grid: List[List[Cell]], force: bool = False) -> bool:
+        return self.send_frame(grid_to_frame(grid), force)
+
+    def send_frame(self, frame: McduFrame, force: bool = False) -> bool:
+        """Queue a frame for sending. Returns False if it was skipped as identical to the MCDU content."""
+        self.start()
+        rows = frame.rows
+        with self._lock:
+            # the frame still waiting in the mailbox is what the MCDU will show next
+            last = self._mailbox.rows if self._mailbox is not None else self._last_rows
+            if last is None:
+                self.dirty_rows = [True] * len(rows)
+            else:
+                self.dirty_rows = [row != last_row for row, last_row in zip(rows, last)]
+            skip = not force and last is not None and not any(self.dirty_rows)
+            if skip:
+                self.frames_skipped += 1
+            else:
+                self._post(frame)
+        self._maybe_report_stats()
+        if skip:
+            return False
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    # ---- asyncio side ----
+    def _thread_main(self):
+        asyncio.run(self._run())
+
+    def _post(self, frame: McduFrame):
+        # with _lock held; the caller wakes the sender
+        if self._mailbox is not None:
+            self.frames_coalesced += 1
+        self._mailbox = frame
+        self._latest = frame
+
+    def _requeue(self, frame: McduFrame):
+        # a frame that did not reach the MCDU goes back unless a newer one is already waiting
+        with self._lock:
+            self._last_rows = None
+            if self._mailbox is None:
+                self._mailbox = frame
+        self._wakeup.set()
+
+    def _stop(self):
+        for task in asyncio.all_tasks(self._loop):
+            task.cancel()
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._connected = asyncio.Event()
+        self._ready.set()
+        try:
+            await asyncio.gather(self._maintain_connection(), self._sender())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self.ws is not None:
+                await self.ws.close()
+
+    async def _maintain_connection(self):
+        while True:
+            try:
+                logging.info(f"Connecting to MCDU at {self.url}")
+                self.ws = await ws_client.connect(self.url, open_timeout=self.connect_timeout,
+                                                  ping_interval=self._ping_interval)
+                logging.info("MCDU connected.")
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logging.debug(f"MCDU connect failed: {e}")
+                await asyncio.sleep(self._reconnect_interval)
+                continue
+            # a fresh connection needs a full frame
+            with self._lock:
+                self._last_rows = None
+                if self._mailbox is None and self._latest is not None:
+                    self._post(self._latest)
+                    self._wakeup.set()
+            self._connected.set()
             try:
-                self.ws.ping("")
-                self._last_ping = now
-            except Exception:
-                try:
-                    self.ws.close()
-                except Exception:
+                # the MCDU only talks back for key presses, which this bridge does not use
+                async for _ in self.ws:
                     pass
+            except websockets.exceptions.ConnectionClosed as e:
+                logging.debug(f"MCDU connection closed: {e}")
+            finally:
+                self._connected.clear()
                 self.ws = None
+                with self._lock:
+                    self._last_rows = None
+            await asyncio.sleep(self._reconnect_interval)
 
-    def send_grid(self, grid: List[List[Cell]]):
-        payload = grid_to_payload(grid)
-        for attempt in (1, 2):
+    async def _sender(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await self._connected.wait()
+            with self._lock:
+                frame, self._mailbox = self._mailbox, None
+                if frame is not None:
+                    # from here on send_frame() compares against this frame
+                    self._last_rows = frame.rows
+            if frame is None:
+                continue
+            ws = self.ws
+            if ws is None:
+                self._requeue(frame)
+                continue
             try:
-                self._ensure()
-                self.ws.send(payload)
-                logging.debug(f"→ MCDU SEND {len(payload)} bytes")
-                self._maybe_ping()
-                return
-            except (WebSocketException, OSError) as e:
-                logging.debug(f"MCDU send attempt {attempt} failed: {e}")
-                try:
-                    if self.ws: self.ws.close()
-                except Exception:
-                    pass
-                self.ws = None
-        logging.debug("MCDU send failed after retry.")
+                await ws.send(frame.payload)
+                logging.debug(f"→ MCDU SEND {len(frame.payload)} bytes")
+                self.frames_sent += 1
+                if self.recorder is not None:
+                    self.recorder.payload(frame.payload)
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                # connection dropped while sending, keep the newest frame for the reconnect
+                logging.debug(f"MCDU send failed: {e}")
+                self._requeue(frame)
 
-# ========================= MAIN =========================
-if __name__ == "__main__":
-    # Uncomment to log to file + console:
-    # setupLogging("SimConnectMobiFlight.log")
+# ========================= LVARs =========================
+LVAR_INIT_TIMEOUT = 5.0  # seconds to wait for the first values before drawing anyway
+# the CAS page only reads the as01() level of its LVARs, so analog jitter below a level change is dropped
+CAS_LVAR_FILTER = LVarFilter(boolean=True)
 
-    # SimConnect / MobiFlight var reader
-    sm = SimConnectMobiFlight()
-    vr = MobiFlightVariableRequests(sm)
-    vr.clear_sim_variables()
+# ========================= Render timing =========================
+EVENT_DRIVEN = True       # redraw only when an LVAR changed; False = fixed-rate polling
+POLL_INTERVAL = 0.1       # seconds between redraws in polling mode
+MAX_FRAME_RATE = 20.0     # Hz, upper bound on redraws while LVARs change rapidly
+KEEPALIVE_INTERVAL = 5.0  # seconds, redraw without changes so the MCDU recovers from reconnects
+CACHE_REPORT_INTERVAL = 60.0  # seconds between page cache hit/miss log lines
 
-    # MCDU socket (captain)
-    MCDU_URL = "ws://127.0.0.1:8320/winwing/cdu-captain"
-    mcdu = McduSocket(MCDU_URL)
+# ========================= CAS page loop =========================
+MCDU_URL = "ws://127.0.0.1:8320/winwing/cdu-captain"
 
+def run_cas_page(vr: MobiFlightVariableRequests, mcdu: McduSocket, table: AnnunciatorTable,
+                 stop: Optional[threading.Event] = None, show_stall: bool = True):
     # initial screen
     grid = empty_grid()
     clear_area_with_spaces(grid, 0, CDU_ROWS-1)  # full screen spaces
     put_text_center(grid, "MISC", 6, colour="k", size=LARGE)
     mcdu.send_grid(grid)
 
-    while True:
+    page_index = vr.indices([table.page_lvar])[0]
+    lvar_indices = vr.indices(table.lvars)
+    last_version = -1
+    last_stalled = False
+    stall_frame = grid_to_frame(render_stall_page())
+    last_cache_report = time()
+    while stop is None or not stop.is_set():
+        changed = True
+        if EVENT_DRIVEN:
+            changed = vr.wait_for_change(KEEPALIVE_INTERVAL)
+        frame_start = time()
         try:
-            # HELPERS
-            cdsPage     = as01(vr.get("(L:cdsPage)"))
-            cdsBreaker  = as01(vr.get("(L:brkCDS1)"))
-            
-            # LEFT
-            engine1Fail = as01(vr.get("(L:engine1Fail)"))     # ENG FAIL
-            eng1OilPr   = as01(vr.get("(L:engine1OilPress)")) # ENG OIL P
-            fadec1Fail  = as01(vr.get("(L:fadecFail1)"))      # FADEC FAIL
-            eng1FuelPr  = as01(vr.get("(L:fuelPress1)"))      # FUEL PRESS
-            eng1Idle    = as01(vr.get("(L:eng1Idle)"))        # ENG IDLE
-            train1      = as01(vr.get("(L:train1)"))          # TRAIN
-            train1idle  = as01(vr.get("(L:trainIdle1)"))      # TRAIN IDLE
-            eng1Manual  = as01(vr.get("(L:eng1Manual)"))      # ENG MANUAL
-            twinsgrip1  = as01(vr.get("(L:twinsgrip1)"))      # TWIST GRIP
-            fuelValve1  = as01(vr.get("(L:fuelValve1)"))      # FUEL VALVE
-            primePump1  = as01(vr.get("(L:primePump1)"))      # PRIME PUMP
-            degraded1   = as01(vr.get("(L:degraded1)"))       # DEGRADED
-            redund1     = as01(vr.get("(L:redund1)"))         # REDUND
-            eng1HydPr   = as01(vr.get("(L:hydraulic1)"))      # HYD PRESS
-            gen1disc    = as01(vr.get("(L:genDiscon1)"))      # GEN DISCON
-            inverter1   = as01(vr.get("(L:inv1)"))            # INVERTER
-            fireTest1Ext= as01(vr.get("(L:fireTest1Ext)"))    # FIRE EXT
-            fireTest1   = as01(vr.get("(L:fireTest1)"))       # FIRE TEST
-            bustie1     = as01(vr.get("(L:bustie1)"))         # BUS TIE
-            starter1    = as01(vr.get("(L:starter1)"))        # STARTER
-
-            # RIGHT
-            engine2Fail = as01(vr.get("(L:engine2Fail)"))     # ENG FAIL
-            eng2OilPr   = as01(vr.get("(L:engine2OilPress)")) # ENG OIL P
-            fadec2Fail  = as01(vr.get("(L:fadecFail2)"))      # FADEC FAIL
-            eng2FuelPr  = as01(vr.get("(L:fuelPress2)"))      # FUEL PRESS
-            eng2Idle    = as01(vr.get("(L:eng2Idle)"))        # ENG IDLE
-            train2      = as01(vr.get("(L:train2)"))          # TRAIN
-            train2idle  = as01(vr.get("(L:trainIdle2)"))      # TRAIN IDLE
-            eng2Manual  = as01(vr.get("(L:eng2Manual)"))      # ENG MANUAL
-            twinsgrip2  = as01(vr.get("(L:twinsgrip2)"))      # TWIST GRIP
-            fuelValve2  = as01(vr.get("(L:fuelValve2)"))      # FUEL VALVE
-            primePump2  = as01(vr.get("(L:primePump2)"))      # PRIME PUMP
-            degraded2   = as01(vr.get("(L:degraded2)"))       # DEGRADED
-            redund2     = as01(vr.get("(L:redund2)"))         # REDUND
-            eng2HydPr   = as01(vr.get("(L:hydraulic2)"))      # HYD PRESS
-            gen2disc    = as01(vr.get("(L:genDiscon2)"))      # GEN DISCON
-            inverter2   = as01(vr.get("(L:inv2)"))            # INVERTER
-            fireTest2Ext= as01(vr.get("(L:fireTest2Ext)"))    # FIRE EXT
-            fireTest2   = as01(vr.get("(L:fireTest2)"))       # FIRE TEST
-            bustie2     = as01(vr.get("(L:bustie2)"))         # BUS TIE
-            starter2    = as01(vr.get("(L:starter2)"))        # STARTER
-
-            # MISC
-            xmsnOilTemp= as01(vr.get("(L:xmsnOilTemp)"))      # XMSN OIL T
-            rotorBrake = as01(vr.get("(L:rotorBrake)"))       # ROTOR BRAKE
-            autopilot  = as01(vr.get("(L:autopilot)"))        # AUTOPILOT
-            fuelPumpAf = as01(vr.get("(L:fuelPumpAft)"))      # F PUMP AFT
-            fuelPumpFw = as01(vr.get("(L:fuelPumpFwd)"))      # F PUMP FWD
-            batDisc    = as01(vr.get("(L:batDisc)"))          # BAT DISCON
-            extPower   = as01(vr.get("(L:extPower)"))         # EXT POWER
-            shedEmer   = as01(vr.get("(L:shedEmer)"))         # SHED EMER
-
-            # GREEN
-            pitotPilot = as01(vr.get("(L:pitotPilot)"))       # P/S-HTR-P
-            pitotCoPi  = as01(vr.get("(L:pitotCoPilot)"))     # P/S-HTR-C
-            cdsAck     = as01(vr.get("(L:cdsSelfTestAcknoledge)"))       # CDS PASSED & INP PASSED
-            landLight  = as01(vr.get("(L:landLight)"))        # LDG LIGHT
-            landLiExt  = as01(vr.get("(L:landLightExtr)"))    # LDG LIGHT RET/EXT
-            airCond    = as01(vr.get("(L:airCond)"))          # AIR COND
-            
-            # Rolling (compacted) lists
-            # -------- Build rolling (compacted) lists --------
-            left_pairs = [
-                (engine1Fail,  "ENG FAIL"),
-                (eng1OilPr,    "ENG OIL P"),
-                (fadec1Fail,   "FADEC FAIL"),
-                (eng1FuelPr,   "FUEL PRESS"),
-                (eng1Idle,     "ENG IDLE"),
-                (train1,       "TRAIN"),
-                (train1idle,   "TRAIN IDLE"),
-                (eng1Manual,   "ENG MANUAL"),
-                (twinsgrip1,   "TWIST GRIP"),
-                (fuelValve1,   "FUEL VALVE"),
-                (primePump1,   "PRIME PUMP"),
-                (degraded1,    "DEGRADED"),
-                (redund1,      "REDUND"),
-                (eng1HydPr,    "HYD PRESS"),
-                (gen1disc,     "GEN DISCON"),
-                (inverter1,    "INVERTER"),
-                (fireTest1Ext, "FIRE EXT"),
-                (fireTest1,    "FIRE TEST"),
-                (bustie1,      "BUS TIE"),
-                (starter1,     "STARTER"),
-            ]
-
-            right_pairs = [
-                (engine2Fail,  "ENG FAIL"),
-                (eng2OilPr,    "ENG OIL P"),
-                (fadec2Fail,   "FADEC FAIL"),
-                (eng2FuelPr,   "FUEL PRESS"),
-                (eng2Idle,     "ENG IDLE"),
-                (train2,       "TRAIN"),
-                (train2idle,   "TRAIN IDLE"),
-                (eng2Manual,   "ENG MANUAL"),
-                (twinsgrip2,   "TWIST GRIP"),
-                (fuelValve2,   "FUEL VALVE"),
-                (primePump2,   "PRIME PUMP"),
-                (degraded2,    "DEGRADED"),
-                (redund2,      "REDUND"),
-                (eng2HydPr,    "HYD PRESS"),
-                (gen2disc,     "GEN DISCON"),
-                (inverter2,    "INVERTER"),
-                (fireTest2Ext, "FIRE EXT"),
-                (fireTest2,    "FIRE TEST"),
-                (bustie2,      "BUS TIE"),
-                (starter2,     "STARTER"),
-            ]
-
-            misc_pairs = [
-                (xmsnOilTemp, "XMSN OIL T"),
-                (rotorBrake,  "ROTOR BRAKE"),
-                (autopilot,   "AUTOPILOT"),
-                (fuelPumpAf,  "F PUMP AFT"),
-                (fuelPumpFw,  "F PUMP FWD"),
-                (batDisc,     "BAT DISCON"),
-                (extPower,    "EXT POWER"),
-                (shedEmer,    "SHED EMER"),
-            ]
-
-            # build labels
-            left_labels  = compact_labels(left_pairs)
-            right_labels = compact_labels(right_pairs)
-            misc_labels  = [label for val, label in misc_pairs if val == 1]
-
-            # paging (cdsPage: 0,1,2) — 6 rows per page for ALL THREE lists
-            page_size = 6
-            start = cdsPage * page_size
-            end   = start + page_size
-
-            visible_left  = left_labels[start:end]
-            visible_right = right_labels[start:end]
-            visible_misc  = misc_labels[start:end]
-
-            # Draw & send
-            grid = empty_grid()
-            put_text_center(grid, "MISC", 6, colour="k", size=LARGE)
-            if cdsBreaker == 1: #Check if CDS has power
-                # left/right columns (clears rows 1..6 internally)
-                draw_columns(grid, visible_left, visible_right)
-
-                # --- MISC block (2 columns × 3 rows, fill left column first) ---
-                # Split page into two 3-item columns
-                misc_left  = visible_misc[:3]
-                misc_right = visible_misc[3:6]
-
-                # Paint left column (cols 0..11), rows 8..10
-                for i, label in enumerate(misc_left):
-                    put_text(grid, label[:11].ljust(11), 7 + i, 0, colour="a", size=LARGE)
-
-                # Paint right column (cols 13..23), rows 8..10
-                for i, label in enumerate(misc_right):
-                    put_text(grid, label[:11].ljust(11), 7 + i, 13, colour="a", size=LARGE)
-
-                # --- Green block ---
-                if pitotPilot == 1: put_text(grid, "P/S-HTR-P", 10, 0,  colour="g", size=LARGE)
-                if pitotCoPi  == 1: put_text(grid, "P/S-HTR-C", 10, 13, colour="g", size=LARGE)
-
-                if cdsAck == 0:
-                    row11, row12, row13 = "CDS PASSED", "INP PASSED", None
+            snapshot = vr.snapshot()
+            # the command queue probes the WASM module and wakes wait_for_change() when it stalls
+            stalled = show_stall and vr.commands.stalled
+            # redraw on a new snapshot version, a stall or its end, or on the idle keep-alive refresh
+            if snapshot.version != last_version or stalled != last_stalled or not changed:
+                last_version = snapshot.version
+                last_stalled = stalled
+                if stalled:
+                    frame = stall_frame
                 else:
-                    row11 = "LDG L EXT" if landLiExt == 1 else "LDG L RET"
-                    if landLight == 1:
-                        row12, row13 = "LDG LIGHT", ("AIR COND " if airCond == 1 else None)
-                    else:
-                        row12, row13 = ("AIR COND " if airCond == 1 else None), None
-
-                for r, txt in ((11, row11), (12, row12), (13, row13)):
-                    if txt: put_text_center(grid, txt, r, colour="g", size=LARGE)
-            # MCDU send
-            mcdu.send_grid(grid)
+                    values = snapshot.values
+                    page = as01(values[page_index])
+                    mask = table.evaluate([values[i] for i in lvar_indices])
+                    frame = render_cas_frame(table, mask, page)
+                # MCDU send; the keep-alive goes out even unchanged, to repaint an MCDU that lost its content
+                mcdu.send_frame(frame, force=not changed)
+            if time() - last_cache_report >= CACHE_REPORT_INTERVAL:
+                last_cache_report = time()
+                # pylint false positive: it checks cache_info() against render_cas_frame's signature
+                logging.info("CAS page cache: %s", render_cas_frame.cache_info())  # pylint: disable=no-value-for-parameter
+                vr.sm.log_client_data_stats()
+                logging.info("MobiFlight commands: %s", vr.commands.stats())
+                logging.info("LVAR updates dropped by filters: %s", vr.filtered_updates)
+                logging.info("LVAR writes: %s", vr.sets.stats())
 
         except Exception as e:
             logging.exception(f"Loop error: {e}")
 
-        sleep(0.1)  # tick rate
+        if EVENT_DRIVEN:
+            # frame rate cap: changes arriving meanwhile keep the event set and are drawn next
+            sleep(max(0.0, 1.0 / MAX_FRAME_RATE - (time() - frame_start)))
+        else:
+            sleep(POLL_INTERVAL)  # tick rate
+
+# ========================= Record / replay =========================
+# Compact gzip'ed binary log of LVAR updates and MCDU payloads. Every record starts with
+# a 1-byte type and the time in microseconds since the recording started:
+#   N: variable id (u16), name length (u16), name  -- once per variable, before its first L
+#   L: variable id (u16), value (f32)
+#   P: payload length (u32), payload (utf-8)
+RECORDING_MAGIC = b"EC135REC1"
+_RECORD_HEADER = struct.Struct("<cQ")
+_RECORD_NAME = struct.Struct("<HH")
+_RECORD_LVAR = struct.Struct("<Hf")
+_RECORD_PAYLOAD = struct.Struct("<I")
+REPLAY_DRAIN_TIME = 1.0  # seconds
+RECORDING_FLUSH_INTERVAL = 1.0  # seconds; a recording cut off by a crash ends at its last flush
+
+class BridgeRecorder:
+    def __init__(self, path: str):
+        logging.info("Recording LVAR updates and MCDU payloads to %s", path)
+        self._file = gzip.open(path, "wb")
+        self._file.write(RECORDING_MAGIC)
+        self._start = perf_counter()
+        self._last_flush = self._start
+        self._lock = threading.Lock()
+        self._named_ids = set()
+
+    def _timestamp(self) -> int:
+        return int((perf_counter() - self._start) * 1e6)
+
+    def _maybe_flush(self):
+        # with _lock held
+        now = perf_counter()
+        if now - self._last_flush >= RECORDING_FLUSH_INTERVAL:
+            self._last_flush = now
+            self._file.flush()
+
+    def lvar(self, id: int, name: str, value: float):
+        with self._lock:
+            t = self._timestamp()
+            if id not in self._named_ids:
+                self._named_ids.add(id)
+                encoded = name.encode("utf-8")
+                self._file.write(_RECORD_HEADER.pack(b"N", t) + _RECORD_NAME.pack(id, len(encoded)) + encoded)
+            self._file.write(_RECORD_HEADER.pack(b"L", t) + _RECORD_LVAR.pack(id, value))
+            self._maybe_flush()
+
+    def payload(self, payload: str):
+        encoded = payload.encode("utf-8")
+        with self._lock:
+            self._file.write(_RECORD_HEADER.pack(b"P", self._timestamp()) + _RECORD_PAYLOAD.pack(len(encoded)) + encoded)
+            self._maybe_flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def read_recording(path: str):
+    """Yield (kind, seconds, data) for every record: ("L", t, (name, value)) or ("P", t, payload)."""
+    names = {}
+    with gzip.open(path, "rb") as file:
+        if file.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not an EC135 bridge recording")
+        while True:
+            try:
+                header = file.read(_RECORD_HEADER.size)
+            except EOFError:
+                return  # no gzip trailer: the recorder was not closed, the data ends at its last flush
+            if len(header) < _RECORD_HEADER.size:
+                return
+            kind, t = _RECORD_HEADER.unpack(header)
+            seconds = t / 1e6
+            if kind == b"N":
+                id, length = _RECORD_NAME.unpack(file.read(_RECORD_NAME.size))
+                names[id] = file.read(length).decode("utf-8")
+            elif kind == b"L":
+                id, value = _RECORD_LVAR.unpack(file.read(_RECORD_LVAR.size))
+                yield "L", seconds, (names.get(id, str(id)), round(value, 5))
+            elif kind == b"P":
+                (length,) = _RECORD_PAYLOAD.unpack(file.read(_RECORD_PAYLOAD.size))
+                yield "P", seconds, file.read(length).decode("utf-8")
+            else:
+                raise ValueError(f"Unknown record type {kind!r} in {path}")
+
+class ReplaySimConnect(SimConnectMobiFlight):
+    """SimConnectMobiFlight stand-in without a simulator: dll calls do nothing and the
+    replayer injects LVAR values as if they arrived through the dispatch thread."""
+    class _NullDll:
+        def __getattr__(self, name):
+            return lambda *args: 0
+
+    def __init__(self):
+        # no SimConnect.__init__: there is no DLL and no pump thread to start
+        self.client_data_handlers = []
+        self.client_data_routes = {}
+        self.client_data_stats = {}
+        self.dispatch_complete_handlers = []
+        self.dll = self._NullDll()
+        self.hSimConnect = None
+        self.quit = 0
+        self._client_data = SIMCONNECT_RECV_CLIENT_DATA()
+        self._client_data.dwSize = CLIENT_DATA_HEADER_SIZE + sizeof(FLOAT)
+
+    def inject(self, define_id: int, value: float):
+        self._client_data.dwDefineID = define_id
+        self._client_data.dwData[0] = struct.unpack("I", struct.pack("<f", value))[0]
+        self.dispatch_client_data(self._client_data)
+        for handler in self.dispatch_complete_handlers:
+            handler()
+
+    def exit(self):
+        self.quit = 1
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def replay_recording(path: str, fast: bool = False, port: int = 8329) -> dict:
+    """Feed a recording through the bridge into a local stand-in MCDU server and measure it.
+
+    Latency is measured from injecting the LVAR update that changes the page to the stand-in
+    server receiving the matching payload. fast=True replays as fast as possible instead of 1x.
+    """
+    table = load_annunciator_table()
+    received = []  # (receive time, payload)
+    server_ready = threading.Event()
+    server_stop = threading.Event()
+
+    def serve_mcdu():
+        async def handler(websocket):
+            async for message in websocket:
+                received.append((perf_counter(), message))
+
+        async def main():
+            async with ws_server.serve(handler, "127.0.0.1", port):
+                server_ready.set()
+                while not server_stop.is_set():
+                    await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+
+    server_thread = threading.Thread(target=serve_mcdu, name="ReplayMcduServer", daemon=True)
+    server_thread.start()
+    server_ready.wait()
+
+    sm = ReplaySimConnect()
+    # there is no WASM module to answer commands: no probes and no stall page
+    vr = MobiFlightVariableRequests(sm, probe_interval=None)
+    vr.register(table.all_lvars, default=0.0, filters=CAS_LVAR_FILTER)
+    mcdu = McduSocket(f"ws://127.0.0.1:{port}/winwing/cdu-captain")
+    stop = threading.Event()
+    loop_thread = threading.Thread(target=run_cas_page, args=(vr, mcdu, table, stop, False), name="ReplayCasPage", daemon=True)
+    loop_thread.start()
+
+    # expected payload -> times the LVAR updates producing it were injected, oldest first
+    expected: Dict[str, deque] = {}
+    values = {lvar: 0.0 for lvar in table.all_lvars}
+    last_payload = None
+    injected = 0
+    replay_start = perf_counter()
+    for kind, t, data in read_recording(path):
+        if kind != "L":
+            continue
+        name, value = data
+        if name not in vr.sim_var_name_to_id:
+            continue
+        if not fast:
+            delay = t - (perf_counter() - replay_start)
+            if delay > 0:
+                sleep(delay)
+        inject_time = perf_counter()
+        sm.inject(vr.sim_var_name_to_id[name], value)
+        injected += 1
+        values[name] = value
+        mask = table.evaluate([values[lvar] for lvar in table.lvars])
+        payload = render_cas_frame(table, mask, as01(values[table.page_lvar])).payload
+        if payload != last_payload:
+            last_payload = payload
+            expected.setdefault(payload, deque()).append(inject_time)
+    sleep(REPLAY_DRAIN_TIME)  # let the last frames reach the stand-in server
+    elapsed = perf_counter() - replay_start
+    stop.set()
+    vr.changed.set()
+    loop_thread.join(timeout=2.0)
+    mcdu.close()
+    server_stop.set()
+    server_thread.join(timeout=2.0)
+
+    latencies = []
+    for recv_time, payload in received:
+        inject_times = expected.get(payload)
+        if not inject_times:
+            continue
+        # earlier injections of the same page that were coalesced away before they were sent
+        while len(inject_times) > 1 and inject_times[1] <= recv_time:
+            inject_times.popleft()
+        latencies.append(recv_time - inject_times.popleft())
+    latencies.sort()
+    return {
+        "lvar_updates": injected,
+        "frames": len(received),
+        "elapsed_s": elapsed,
+        "fps": len(received) / elapsed if elapsed else 0.0,
+        "latency_ms_p50": _percentile(latencies, 0.50) * 1000.0,
+        "latency_ms_p90": _percentile(latencies, 0.90) * 1000.0,
+        "latency_ms_p99": _percentile(latencies, 0.99) * 1000.0,
+        "latency_ms_max": (latencies[-1] if latencies else 0.0) * 1000.0,
+        "coalesced": mcdu.frames_coalesced,
+    }
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="EC135 CAS page bridge from MSFS LVARs to the WinWing MCDU")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--benchmark", action="store_true", help="time grid_to_payload() and exit")
+    mode.add_argument("--replay", metavar="FILE", help="replay a recording into a local stand-in MCDU and report latencies")
+    mode.add_argument("--record", metavar="FILE", help="run the bridge and record LVAR updates and MCDU payloads")
+    parser.add_argument("--fast", action="store_true", help="with --replay: replay as fast as possible instead of 1x")
+    arguments = parser.parse_args()
+    if arguments.fast and not arguments.replay:
+        parser.error("--fast requires --replay")
+    return arguments
+
+# ========================= MAIN =========================
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if arguments.benchmark:
+        benchmark_grid_to_payload()
+        sys.exit(0)
+
+    if arguments.replay:
+        logging.basicConfig(level=logging.WARNING)
+        for key, value in replay_recording(arguments.replay, fast=arguments.fast).items():
+            print(f"{key:>16}: {value:.2f}" if isinstance(value, float) else f"{key:>16}: {value}")
+        sys.exit(0)
+
+    # Uncomment to log to file + console:
+    # setupLogging("SimConnectMobiFlight.log")
+
+    # SimConnect / MobiFlight var reader
+    sm = SimConnectMobiFlight()
+    vr = MobiFlightVariableRequests(sm)
+
+    # MCDU socket (captain)
+    mcdu = McduSocket(MCDU_URL)
+
+    recorder = None
+    if arguments.record:
+        recorder = vr.recorder = mcdu.recorder = BridgeRecorder(arguments.record)
+
+    try:
+        table = load_annunciator_table()
+        if LVAR_REGISTRY_FILE is None:
+            vr.clear_sim_variables()
+        else:
+            # warm start: reuse the subscriptions the WASM module kept from the last run
+            vr.reattach(LVAR_REGISTRY_FILE, table.all_lvars)
+        vr.register(table.all_lvars, default=0.0, filters=CAS_LVAR_FILTER)
+        # each MF.SimVars.Add holds the queue for two frames, so at low frame rates the Adds alone
+        # outlast LVAR_INIT_TIMEOUT; every command ends within ack_timeout, so this returns
+        vr.commands.wait_until_idle()
+        if vr.wait_for_registration(LVAR_INIT_TIMEOUT) and LVAR_REGISTRY_FILE is not None:
+            vr.save_registry(LVAR_REGISTRY_FILE)
+        vr.wait_until_initialized(LVAR_INIT_TIMEOUT)
+
+        run_cas_page(vr, mcdu, table)
+    finally:
+        if recorder is not None:
+            # writes the gzip trailer; without it the recording ends at its last flush
+            vr.recorder = mcdu.recorder = None
+            recorder.close()
@@ -1,4 +1,3 @@
-import copy
 from ctypes import wintypes
 import ctypes
 import json
@@ -6,16 +5,47 @@ import logging
 import asyncio
 import os
 import struct
+import threading
+from time import perf_counter
 import websockets.asyncio.client as ws_client
-from typing import Optional, List, Dict, Union, Any
+from typing import Optional, List, Dict, Any
+try:
+    import numpy as np  # optional, enables create_mobi_json_numpy()
+except ImportError:
+    np = None
 from SimConnect import SimConnect, Enum
 from SimConnect.Enum import SIMCONNECT_CLIENT_DATA_ID, SIMCONNECT_RECV_ID, SIMCONNECT_RECV_CLIENT_DATA
 
 
+class ClientDataHandlerStats:
+    """Call count and time spent in one client data handler."""
+    __slots__ = ("name", "define_ids", "calls", "seconds", "max_seconds")
+
+    def __init__(self, handler):
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.define_ids = []
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def __str__(self):
+        average = self.seconds / self.calls * 1e6 if self.calls else 0.0
+        routes = self.define_ids or "all"
+        return f"{self.name} (define ids {routes}): {self.calls} calls, avg {average:.1f} us, max {self.max_seconds * 1e6:.1f} us"
+
+
 class SimConnectMobiFlight(SimConnect):
 
     def __init__(self, auto_connect=True, library_path=None):
-        self.client_data_handlers = []
+        self.client_data_handlers = []  # catch-all, for packets whose define id has no route
+        self.client_data_routes = {}    # dwDefineID -> [handler, ...]
+        self.client_data_stats = {}     # handler -> ClientDataHandlerStats
         if library_path:
             super().__init__(auto_connect, library_path)
         else:
@@ -24,26 +54,64 @@ class SimConnectMobiFlight(SimConnect):
         self.dll.MapClientDataNameToID.argtypes = [wintypes.HANDLE, ctypes.c_char_p, SIMCONNECT_CLIENT_DATA_ID]
 
 
-    def register_client_data_handler(self, handler):
-        if not handler in self.client_data_handlers:
+    def register_client_data_handler(self, handler, define_id=None):
+        # with a define_id the handler only gets packets of that definition (one dict lookup per
+        # packet); without one it is a catch-all for packets no routed handler is registered for
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.setdefault(define_id, [])
+        if handler not in handlers:
             logging.info("Register new client data handler")
-            self.client_data_handlers.append(handler)
+            handlers.append(handler)
+            stats = self.client_data_stats.setdefault(handler, ClientDataHandlerStats(handler))
+            if define_id is not None:
+                stats.define_ids.append(define_id)
 
 
-    def unregister_client_data_handler(self, handler):
-        if handler in self.client_data_handlers:
+    def unregister_client_data_handler(self, handler, define_id=None):
+        handlers = self.client_data_handlers if define_id is None else self.client_data_routes.get(define_id, [])
+        if handler in handlers:
             logging.info("Unregister client data handler")
-            self.client_data_handlers.remove(handler)
+            handlers.remove(handler)
+            if define_id is not None and not handlers:
+                del self.client_data_routes[define_id]
+
+
+    def log_client_data_stats(self):
+        for stats in self.client_data_stats.values():
+            logging.info("Client data handler %s", stats)
 
 
     def my_dispatch_proc(self, pData, cbData, pContext):
         dwID = pData.contents.dwID
         if dwID == SIMCONNECT_RECV_ID.SIMCONNECT_RECV_ID_CLIENT_DATA:
             client_data = ctypes.cast(pData, ctypes.POINTER(SIMCONNECT_RECV_CLIENT_DATA)).contents
-            for handler in self.client_data_handlers:
-                handler(client_data)
+            self.dispatch_client_data(client_data)
         else:
             super().my_dispatch_proc(pData, cbData, pContext)
+
+
+    def dispatch_client_data(self, client_data):
+        handlers = self.client_data_routes.get(client_data.dwDefineID, self.client_data_handlers)
+        for handler in handlers:
+            start = perf_counter()
+            handler(client_data)
+            self.client_data_stats[handler].record(perf_counter() - start)
+
+
+# Size of the SIMCONNECT_RECV_CLIENT_DATA header in front of dwData
+CLIENT_DATA_HEADER_SIZE: int = SIMCONNECT_RECV_CLIENT_DATA.dwData.offset
+DWORD_SIZE: int = ctypes.sizeof(wintypes.DWORD)
+
+
+def client_data_bytes(client_data: Any, size: int) -> bytes:
+    """Up to `size` bytes of a client data packet's payload, copied out of dwData in one go."""
+    size = max(0, min(size, client_data.dwSize - CLIENT_DATA_HEADER_SIZE))
+    if DWORD_SIZE == 4:
+        return ctypes.string_at(ctypes.addressof(client_data.dwData), size)
+    # DWORD is 8 bytes wide off Windows (e.g. under Tools/fake_simconnect.py): one value per element
+    words = -(-size // 4)
+    return struct.pack(f"{words}I", *client_data.dwData[:words])[:size]
+
+
 # URLs
 CAPTAIN_CDU_URL: str = "ws://localhost:8320/winwing/cdu-captain"
 CO_PILOT_CDU_URL: str = "ws://localhost:8320/winwing/cdu-co-pilot"
@@ -54,6 +122,7 @@ CDU_COLUMNS: int = 24
 CDU_ROWS: int = 14
 CDU_CELLS: int = CDU_COLUMNS * CDU_ROWS
 CDU_CELL_BYTE_COUNT: int = 3
+CDU_DATA_SIZE: int = CDU_CELLS * CDU_CELL_BYTE_COUNT
 
 # CDU Color constants
 CDU_COLOR_WHITE: int = 0
@@ -113,9 +182,12 @@ class MobiFlightClient:
         logging.info("Max retries reached. Giving up connecting to MobiFlight at %s. If you only have one CDU attached, you can ignore this message.", self.websocket_uri)
         self.connected.set()
 
-    async def send(self, data: str) -> None:
+    async def send(self, data: str) -> bool:
+        # False when the frame was dropped because MobiFlight is not connected
         if self.websocket and self.connected.is_set():
             await self.websocket.send(data)
+            return True
+        return False
 
     async def close(self) -> None:
         if self.websocket:
@@ -123,64 +195,145 @@ class MobiFlightClient:
             self.websocket = None
             self.connected.clear()
 
+# Lookup tables for create_mobi_json(), which assembles the same JSON as json.dumps() of
+# {"Target": "Display", "Data": [[symbol, colour, small], ...]} from precomputed fragments
+CDU_COLOR_CODES: Dict[int, str] = {
+    CDU_COLOR_WHITE: "w",
+    CDU_COLOR_CYAN: "c",
+    CDU_COLOR_GREEN: "g",
+    CDU_COLOR_MAGENTA: "m",
+    CDU_COLOR_AMBER: "a",
+    CDU_COLOR_RED: "r"
+}
+CDU_SPECIAL_SYMBOLS: Dict[str, str] = {
+    "\xA1": "\u2190",  # left arrow
+    "\xA2": "\u2192",  # right arrow
+    "\xA3": "\u2191",  # up arrow
+    "\xA4": "\u2193",  # down arrow
+    "\u00CA": "\u2610",  # box
+}
+
+# Cell i of the row-major MobiFlight grid is cell CDU_CELL_ORDER[i] of PMDG's column-major buffer
+CDU_CELL_ORDER: List[int] = [x * CDU_ROWS + y for y in range(CDU_ROWS) for x in range(CDU_COLUMNS)]
+
+def _symbol_json(code: int) -> Optional[str]:
+    # "[" plus the JSON string of the displayed symbol; None for blank cells
+    symbol: str = chr(code).upper()
+    if symbol == ' ' or symbol == '\0':
+        return None
+    return "[" + json.dumps(CDU_SPECIAL_SYMBOLS.get(symbol, symbol))
+
+def _style_json(color: int, flags: int) -> str:
+    # colour and font size closing a cell, indexed by flags << 8 | colour
+    if flags & (CDU_FLAG_UNUSED | CDU_FLAG_REVERSE):
+        color_str: str = "e"  # Gray for unused and reverse video
+    else:
+        color_str = CDU_COLOR_CODES.get(color, "w")
+    return f', "{color_str}", {1 if flags & CDU_FLAG_SMALL_FONT else 0}]'
+
+CDU_SYMBOL_JSON: List[Optional[str]] = [_symbol_json(code) for code in range(256)]
+CDU_STYLE_JSON: List[str] = [_style_json(index & 0xFF, index >> 8) for index in range(1 << 16)]
+
+# Lowercase characters are shown upper case in the small font: CDU_FLAG_SMALL_FONT for them, else 0
+CDU_SYMBOL_FLAGS: List[int] = [CDU_FLAG_SMALL_FONT if chr(code).islower() else 0 for code in range(256)]
+
 def create_mobi_json(data: bytes) -> str:
-    message: Dict[str, Union[str, List[List[Union[str, int]]]]] = {
-        "Target": "Display",
-        "Data": [[] for _ in range(CDU_CELLS)]
-    }
-    
-    # Process data in column-major order as received from PMDG
-    for x in range(CDU_COLUMNS):
-        for y in range(CDU_ROWS):
-            src_idx: int = (x * CDU_ROWS + y) * CDU_CELL_BYTE_COUNT
-            dst_idx: int = y * CDU_COLUMNS + x
-            
-            if src_idx + 2 >= len(data):
-                message["Data"][dst_idx] = []
-                continue
-                
-            try:
-                symbol: str = chr(data[src_idx])
-                is_lowercase: bool = symbol.islower()
-                symbol = symbol.upper()
-                color: int = data[src_idx + 1]
-                flags: int = data[src_idx + 2]
-
-                if symbol == ' ' or symbol == '\0':
-                    message["Data"][dst_idx] = []
-                else:
-                    # Handle special characters
-                    if symbol == '\xA1': symbol = "\u2190"  # left arrow
-                    elif symbol == '\xA2': symbol = "\u2192"  # right arrow
-                    elif symbol == '\xA3': symbol = "\u2191"  # up arrow
-                    elif symbol == '\xA4': symbol = "\u2193"  # down arrow
-                    elif symbol == '\u00CA': symbol = "\u2610"  # box
-                    
-                    # Handle color based on flags
-                    if flags & CDU_FLAG_UNUSED:
-                        color_str: str = "e"  # Gray for unused
-                    elif flags & CDU_FLAG_REVERSE:
-                        color_str = "e"  # Gray for reverse video
-                    else:
-                        color_str = {
-                            CDU_COLOR_WHITE: "w",
-                            CDU_COLOR_CYAN: "c",
-                            CDU_COLOR_GREEN: "g",
-                            CDU_COLOR_MAGENTA: "m",
-                            CDU_COLOR_AMBER: "a",
-                            CDU_COLOR_RED: "r"
-                        }.get(color, "w")
-
-                    message["Data"][dst_idx] = [
-                        symbol,
-                        color_str,
-                        1 if (is_lowercase) or (flags & CDU_FLAG_SMALL_FONT) else 0
-                    ]
-            except (ValueError, TypeError, IndexError) as e:
-                message["Data"][dst_idx] = []
-                logging.debug(f"Error processing cell: {e}")
-    
-    return json.dumps(message)
+    # Only complete cells count; missing ones decode like the blank cells they are padded with
+    data = data[:len(data) - len(data) % CDU_CELL_BYTE_COUNT].ljust(CDU_DATA_SIZE, b"\0")
+    symbols: bytes = data[0::CDU_CELL_BYTE_COUNT]
+    colors: bytes = data[1::CDU_CELL_BYTE_COUNT]
+    flags: bytes = data[2::CDU_CELL_BYTE_COUNT]
+    symbol_json: List[Optional[str]] = CDU_SYMBOL_JSON
+    style_json: List[str] = CDU_STYLE_JSON
+    symbol_flags: List[int] = CDU_SYMBOL_FLAGS
+    cells: List[str] = [
+        "[]" if symbol_json[symbols[cell]] is None
+        else symbol_json[symbols[cell]] + style_json[(flags[cell] | symbol_flags[symbols[cell]]) << 8 | colors[cell]]
+        for cell in CDU_CELL_ORDER
+    ]
+    return '{"Target": "Display", "Data": [' + ", ".join(cells) + "]}"
+
+# NumPy backend (pip install numpy): the buffer is viewed as an array of cells, transposed to
+# row-major and mapped through lookup arrays to indices into CDU_CELL_JSON, the JSON of every
+# symbol x style combination
+if np is not None:
+    CDU_CELL_DTYPE = np.dtype([("symbol", np.uint8), ("color", np.uint8), ("flags", np.uint8)])
+    CDU_STYLES: List[str] = sorted(set(CDU_STYLE_JSON))
+    _style_index: Dict[str, int] = {style: index for index, style in enumerate(CDU_STYLES)}
+    CDU_STYLE_INDEX = np.array([_style_index[style] for style in CDU_STYLE_JSON], dtype=np.intp)
+    CDU_CELL_JSON = np.array(["[]" if symbol is None else symbol + style
+                              for symbol in CDU_SYMBOL_JSON for style in CDU_STYLES], dtype=object)
+    CDU_SYMBOL_FLAG_ARRAY = np.array(CDU_SYMBOL_FLAGS, dtype=np.intp)
+else:
+    CDU_CELL_DTYPE = CDU_STYLES = CDU_STYLE_INDEX = CDU_CELL_JSON = CDU_SYMBOL_FLAG_ARRAY = None  # create_mobi_json_numpy() is only used with NumPy
+
+
+def create_mobi_json_numpy(data: bytes) -> str:
+    # same output as create_mobi_json(), which also handles short buffers
+    if len(data) < CDU_DATA_SIZE:
+        return create_mobi_json(data)
+    cells = np.frombuffer(data, CDU_CELL_DTYPE, CDU_CELLS).reshape(CDU_COLUMNS, CDU_ROWS).T.ravel()
+    symbols = cells["symbol"].astype(np.intp)
+    flags = cells["flags"].astype(np.intp) | CDU_SYMBOL_FLAG_ARRAY[symbols]
+    styles = CDU_STYLE_INDEX[flags << 8 | cells["color"]]
+    return '{"Target": "Display", "Data": [' + ", ".join(CDU_CELL_JSON[symbols * len(CDU_STYLES) + styles].tolist()) + "]}"
+
+# Encoder used by the CDU client: the NumPy backend when NumPy is installed
+mobi_json_encoder = create_mobi_json_numpy if np is not None else create_mobi_json
+
+class FrameMailbox:
+    """Latest-wins, single-slot hand-over of CDU frames from the SimConnect thread to the event loop.
+
+    post() overwrites a frame the sender has not taken yet, so a WebSocket slower than the sim makes
+    the display skip frames instead of queueing them and falling further and further behind.
+    """
+    def __init__(self) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: threading.Lock = threading.Lock()
+        self._frame: Optional[bytes] = None
+        self._pending_since: float = 0.0
+        self._ready: asyncio.Event = asyncio.Event()
+        self.posted: int = 0
+        self.coalesced: int = 0      # frames overwritten before the sender took them
+        self.taken: int = 0
+        self.total_age: float = 0.0  # seconds the slot was pending when taken, summed
+        self.max_age: float = 0.0
+
+    def post(self, frame: bytes) -> None:
+        # SimConnect thread: one lock and, only when the slot was empty, one wake-up of the sender
+        with self._lock:
+            wake: bool = self._frame is None
+            if wake:
+                self._pending_since = perf_counter()
+            else:
+                self.coalesced += 1
+            self._frame = frame
+            self.posted += 1
+        if wake and self.loop is not None:
+            self.loop.call_soon_threadsafe(self._ready.set)
+
+    async def get(self) -> bytes:
+        while True:
+            with self._lock:
+                frame, self._frame = self._frame, None
+                if frame is not None:
+                    age: float = perf_counter() - self._pending_since
+                    self.taken += 1
+                    self.total_age += age
+                    self.max_age = max(self.max_age, age)
+                    return frame
+                self._ready.clear()
+            await self._ready.wait()
+
+    def age(self) -> float:
+        """Seconds the oldest frame not yet sent has been waiting, 0 when the slot is empty."""
+        with self._lock:
+            return perf_counter() - self._pending_since if self._frame is not None else 0.0
+
+    def __str__(self) -> str:
+        average = self.total_age / self.taken * 1e3 if self.taken else 0.0
+        return (f"{self.posted} frames posted, {self.coalesced} coalesced, {self.taken} sent, "
+                f"queue age avg {average:.2f} ms, max {self.max_age * 1e3:.2f} ms")
 
 class PMDGCDUClient:
     def __init__(self, sc_mobiflight: SimConnectMobiFlight, websocket_uri: str, cdu_name: str, cdu_id: int, cdu_definition: int) -> None:
@@ -190,6 +343,10 @@ class PMDGCDUClient:
         self.cdu_definition: int = cdu_definition
         self.cdu_name: str = cdu_name
         self.cdu_id: int = cdu_id
+        self.last_data: Optional[bytes] = None
+        self.unique_frames: int = 0       # frames that differed from the previous one
+        self.duplicate_frames: int = 0    # frames identical to the previous one, skipped
+        self.mailbox: FrameMailbox = FrameMailbox()
 
     def failed_to_connect(self) -> bool:
         return self.mobiflight.retries >= self.mobiflight.max_retries
@@ -224,29 +381,49 @@ class PMDGCDUClient:
             )
 
             # Set up the handler
-            self.sc_mobiflight.register_client_data_handler(self.handle_cdu_data)
+            self.sc_mobiflight.register_client_data_handler(self.handle_cdu_data, self.cdu_definition)
             logging.info("SimConnect initialized for %s", self.cdu_name)
             return True
         except Exception as e:
             logging.error(f"SimConnect setup failed for {self.cdu_name}: {e}")
             return False
 
+    def log_frame_stats(self) -> None:
+        logging.info("%s: %d unique CDU frames, %d duplicate frames skipped",
+                     self.cdu_name, self.unique_frames, self.duplicate_frames)
+        logging.info("%s: %s", self.cdu_name, self.mailbox)
+
     def handle_cdu_data(self, client_data: Any) -> None:
         try:
             if client_data.dwDefineID == self.cdu_definition and hasattr(client_data, 'dwData'):                
-                int_count : int = int(CDU_COLUMNS * CDU_ROWS * CDU_CELL_BYTE_COUNT / 4)              
-                if len(client_data.dwData) >= int_count:
-                    data_list : bytearray = bytearray()                  
-                    for i in range(int_count): 
-                        my_bytes : bytes = struct.pack("I", client_data.dwData[i])
-                        data_list.extend(my_bytes)                
-                    data: bytes = bytes(data_list)                                       
-                    asyncio.run_coroutine_threadsafe(self.mobiflight.send(create_mobi_json(data)), self.event_loop)
+                data: bytes = client_data_bytes(client_data, CDU_DATA_SIZE)
+                if len(data) == CDU_DATA_SIZE:
+                    # Only decode and send if data has changed; a re-broadcast frame costs one bytes compare
+                    if data == self.last_data:
+                        self.duplicate_frames += 1
+                        return
+                    self.last_data = data
+                    self.unique_frames += 1
+                    self.mailbox.post(data)
         except Exception as e:
             logging.error(f"Error handling CDU data: {e}")
 
+    async def send_frames(self) -> None:
+        # Decodes and sends only the newest frame handle_cdu_data posted to the mailbox
+        while True:
+            data: bytes = await self.mailbox.get()
+            try:
+                sent: bool = await self.mobiflight.send(mobi_json_encoder(data))
+            except Exception as e:
+                logging.error(f"Error sending CDU data: {e}")
+                sent = False
+            if not sent:
+                # the display never got this frame: let the next re-broadcast of it through
+                self.last_data = None
+
     async def run(self) -> None:
         self.event_loop = asyncio.get_running_loop()
+        self.mailbox.loop = self.event_loop
         logging.info("Starting CDU client")
         
         try:
@@ -258,7 +435,9 @@ class PMDGCDUClient:
                 return
             # Initialize SimConnect
             if self.setup_simconnect():
+                sender_task: asyncio.Task = asyncio.create_task(self.send_frames())
                 await asyncio.gather(mobiflight_task)
+                sender_task.cancel()
             else:
                 logging.error("Failed to start - SimConnect initialization failed")
         except KeyboardInterrupt:
@@ -274,11 +453,31 @@ class PMDGConfiguration:
         "pmdg-aircraft-77w",
         "pmdg-aircraft-77f"
     ]
+    # [SDK] settings the bridge needs in the options file
+    sdk_settings: Dict[str, str] = {
+        "EnableDataBroadcast": "1",
+        "EnableCDUBroadcast.0": "1",
+        "EnableCDUBroadcast.1": "1",
+        "EnableCDUBroadcast.2": "1",
+    }
+
+    def start(self) -> threading.Thread:
+        """Run verify_sdk_config() on a background thread, so the CDU clients do not wait for the disk."""
+        # daemon: a Packages scan hanging on the disk must not keep the bridge alive after Ctrl+C
+        thread = threading.Thread(target=self.verify_sdk_config, name="PMDG SDK config", daemon=True)
+        thread.start()
+        return thread
 
     def verify_sdk_config(self):
         """Verify and potentially update the SDK configuration in the options file."""
+        try:
+            for base_path in self.find_work_paths():
+                self.process_config(base_path)
+        except Exception as e:
+            logging.error(f"PMDG SDK configuration check failed: {e}")
+
+    def find_work_paths(self) -> List[str]:
         # Determine the correct path based on MS Store or Steam installation
-        base_path = None
         ms_store_path = os.path.join(
             os.environ.get("LOCALAPPDATA", ""),
             "Packages",
@@ -291,15 +490,15 @@ class PMDGConfiguration:
             os.environ.get("APPDATA", ""), "Microsoft Flight Simulator", "Packages"
         )
 
-        paths = [ms_store_path, steam_path]
+        paths = [path for path in (ms_store_path, steam_path) if os.path.exists(path)]
 
+        found = []
         for directory in self.directories:
             for path in paths:
-                if os.path.exists(path):
-                    base_path = os.path.join(path, directory, "work")
-                    if os.path.exists(base_path):
-                        self.process_config(base_path)
-
+                base_path = os.path.join(path, directory, "work")
+                if os.path.exists(base_path):
+                    found.append(base_path)
+        return found
 
     def process_config(self, base_path: str):
         logging.info(f"Processing config for {base_path}")
@@ -311,75 +510,54 @@ class PMDGConfiguration:
             logging.warning(f"Options file not found: {options_path}")
             return
 
-        # Check if SDK configuration is present
-        config = self.parse_ini_file(options_path)
-
-        original_config = copy.deepcopy(config)
-
-
-        if 'SDK' not in config:
-            config['SDK'] = {}
-        sdk = config["SDK"]
-        sdk['EnableDataBroadcast'] = 1
-        sdk['EnableCDUBroadcast.0'] = 1
-        sdk['EnableCDUBroadcast.1'] = 1
-        sdk['EnableCDUBroadcast.2'] = 1
-
-        if original_config != config:
-            logging.info("Updating SDK configuration")
-            self.write_ini_file(config, options_path)
+        if self.update_ini_file(options_path, "SDK", self.sdk_settings):
+            logging.info("Updated SDK configuration in %s", options_path)
         else:
             logging.info("No changes to SDK configuration needed")
 
-    def parse_ini_file(self, file_path):
-        config = {}
-        current_section = None
-        
-        with open(file_path, 'r') as file:
-            for line in file:
-                # Remove leading/trailing whitespace
-                line = line.strip()
-                
-                # Skip empty lines
-                if not line:
-                    continue
-                    
-                # Check if line is a section header
-                if line.startswith('[') and line.endswith(']'):
-                    current_section = line[1:-1]  # Remove brackets
-                    config[current_section] = {}
+    def update_ini_file(self, file_path: str, section: str, settings: Dict[str, str]) -> bool:
+        """Set `settings` in `section`, leaving every other line of the file as it is. True if it changed."""
+        with open(file_path, "r+", newline="") as file:
+            lines = file.readlines()
+            newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+            changed = False
+            seen = set()
+            in_section = False
+            insert_at = None  # after the last non-blank line of the section
+            for index, line in enumerate(lines):
+                text = line.strip()
+                if text.startswith('[') and text.endswith(']'):
+                    in_section = text[1:-1] == section
+                    if in_section:
+                        insert_at = index + 1
                     continue
-                    
-                # Skip if no section has been defined yet
-                if current_section is None:
+                if not in_section or not text:
                     continue
-                    
-                # Parse key-value pairs
-                if '=' in line:
-                    key, value = line.split('=', 1)  # Split on first '=' only
-                    key = key.strip()
-                    value = value.strip()
-                    
-                    # Convert value to appropriate type
-                    try:
-                        if value.isdigit():
-                            value = int(value)
-                        elif value.replace('.', '').isdigit() and value.count('.') == 1:
-                            value = float(value)
-                    except ValueError:
-                        pass  # Keep as string if conversion fails
-                        
-                    config[current_section][key] = value
-
-        return config
-
-    def write_ini_file(self, config, file_path):
-        with open(file_path, 'w') as file:
-            for section, settings in config.items():
-                file.write(f"[{section}]\n")
-                for key, value in settings.items():
-                    file.write(f"{key}={value}\n")
-                file.write("\n")  # Add blank line between sections
+                insert_at = index + 1
+                if '=' in text:
+                    key, value = (part.strip() for part in text.split('=', 1))
+                    if key in settings:
+                        seen.add(key)
+                        if value != settings[key]:
+                            lines[index] = f"{key}={settings[key]}{newline}"
+                            changed = True
+
+            added = [f"{key}={value}{newline}" for key, value in settings.items() if key not in seen]
+            if added:
+                if insert_at is None:
+                    # no such section yet: append it, separated by a blank line
+                    added = ([newline] if lines else []) + [f"[{section}]{newline}"] + added
+                    insert_at = len(lines)
+                if insert_at > 0 and not lines[insert_at - 1].endswith(("\n", "\r")):
+                    lines[insert_at - 1] += newline
+                lines[insert_at:insert_at] = added
+                changed = True
+
+            if changed:
+                file.seek(0)
+                file.writelines(lines)
+                file.truncate()
+        return changed
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -387,8 +565,9 @@ if __name__ == "__main__":
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
 
+    # checked while SimConnect and the WebSockets connect; PMDG reads the options when the aircraft loads
     ini_configurator = PMDGConfiguration()
-    ini_configurator.verify_sdk_config()
+    ini_configurator.start()
     
     sc_mobiflight: SimConnectMobiFlight = SimConnectMobiFlight()
     captain_client: PMDGCDUClient = PMDGCDUClient(sc_mobiflight, CAPTAIN_CDU_URL, PMDG_CDU_0_NAME, PMDG_CDU_0_ID, PMDG_CDU_0_DEFINITION)
@@ -410,4 +589,8 @@ if __name__ == "__main__":
     except Exception as e:
         logging.error(f"Error: {e}")
     finally:
+        sc_mobiflight.log_client_data_stats()
+        captain_client.log_frame_stats()
+        co_pilot_client.log_frame_stats()
+        observer_client.log_frame_stats()
         sc_mobiflight.exit()